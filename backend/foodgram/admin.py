@@ -1,7 +1,10 @@
 from django.contrib import admin
 
-from .models import (Favorite, Follow, Ingredient, IngredientInRecipe, Recipe,
-                     ShoppingCart, Tag)
+from .custom_mixins import FastDeleteAdminMixin
+from .deletion import delete_recipes
+from .models import (DeletionJob, Favorite, Follow, Ingredient,
+                     IngredientInRecipe, Recipe, ShoppingCart, Tag)
+from .updates import refresh_recipe
 
 
 class IngredientInline(admin.TabularInline):
@@ -9,7 +12,8 @@ class IngredientInline(admin.TabularInline):
 
 
 class TagAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'name', 'color', 'slug')
+    list_display = ('pk', 'name', 'color', 'slug', 'bit')
+    readonly_fields = ('bit',)
     search_fields = ('name',)
     list_filter = ('name',)
     empty_value_display = '-пусто-'
@@ -22,7 +26,7 @@ class IngredientAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(FastDeleteAdminMixin, admin.ModelAdmin):
     list_display = ('pk', 'author', 'name', 'text',
                     'cooking_time', 'favorited')
     list_filter = ('name', 'author', 'tags')
@@ -37,6 +41,19 @@ class RecipeAdmin(admin.ModelAdmin):
 
     favorited.short_description = 'В избранном'
 
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        old_ids = list(recipe.ingredientinrecipe_set.values_list(
+            'ingredient_id', flat=True))
+        super().save_related(request, form, formsets, change)
+        refresh_recipe(recipe, old_ids)
+
+    def delete_model(self, request, obj):
+        delete_recipes(Recipe.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_recipes(queryset)
+
 
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ("pk", "user", "recipe")
@@ -53,9 +70,23 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'email', 'status', 'recipes_deleted',
+                    'recipes_total', 'created', 'finished')
+    list_filter = ('status',)
+    search_fields = ('email',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Follow, FollowAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(DeletionJob, DeletionJobAdmin)
@@ -0,0 +1,96 @@
+"""Асинхронные представления рецептов, тегов и ингредиентов для ASGI."""
+import tempfile
+
+from django.http import FileResponse, HttpResponse, JsonResponse
+
+from .export import CONTENT_TYPE, FILE_NAME, write_export
+from .offload import read_async, run_in_process, run_in_thread
+from .pdf import render_shopping_list_pdf
+from .throttling import (acquire_pdf_slot, pdf_busy, release_pdf_slot,
+                         throttle_setting)
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet, pdf_response
+
+
+class DeferredRecipeViewSet(RecipeViewSet):
+    """Вьюсет, который откладывает отрисовку pdf и выгрузку рецептов до
+    асинхронной части."""
+
+    def shopping_list_response(self, shopping_list):
+        response = pdf_response(b'')
+        response.shopping_list = shopping_list
+        return response
+
+    def export_response(self, user):
+        response = HttpResponse()
+        response.export_user = user
+        return response
+
+
+recipe_list = read_async(RecipeViewSet.as_view(
+    {'get': 'list', 'post': 'create'}))
+recipe_detail = read_async(RecipeViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}))
+tag_list = read_async(TagViewSet.as_view({'get': 'list'}))
+tag_detail = read_async(TagViewSet.as_view({'get': 'retrieve'}))
+ingredient_list = read_async(IngredientViewSet.as_view({'get': 'list'}))
+ingredient_detail = read_async(
+    IngredientViewSet.as_view({'get': 'retrieve'}))
+# Параметры @action (права доступа) роутер передает в as_view сам, а
+# здесь их нужно передать явно.
+shopping_list = read_async(DeferredRecipeViewSet.as_view(
+    {'get': 'download_shopping_cart'},
+    **RecipeViewSet.download_shopping_cart.kwargs))
+export = read_async(DeferredRecipeViewSet.as_view(
+    {'get': 'export'}, **RecipeViewSet.export.kwargs))
+
+
+def pdf_busy_response():
+    response = JsonResponse(
+        {'detail': str(pdf_busy().detail)}, status=429,
+        json_dumps_params={'ensure_ascii': False})
+    response['Retry-After'] = str(throttle_setting('PDF_RETRY_SECONDS'))
+    return response
+
+
+async def download_shopping_cart(request):
+    """Скачать список покупок: pdf рисуется в пуле процессов."""
+    response = await shopping_list(request)
+    items = getattr(response, 'shopping_list', None)
+    if items is None:
+        return response
+    slot = await run_in_thread(acquire_pdf_slot)
+    if slot is None:
+        return pdf_busy_response()
+    try:
+        response.content = await run_in_process(
+            render_shopping_list_pdf, items)
+    finally:
+        await run_in_thread(release_pdf_slot, slot)
+    return response
+
+
+def spool_export(user, request):
+    file = tempfile.TemporaryFile()
+    write_export([user], file, request)
+    file.seek(0)
+    return file
+
+
+async def export_recipes(request):
+    """Выгрузить рецепты в NDJSON.
+
+    Django 3.2 отдает потоковый ответ в цикле событий, где нельзя
+    обращаться к базе, поэтому выгрузка сначала пишется во временный
+    файл в пуле потоков, а затем файл отдается по частям.
+    """
+    response = await export(request)
+    user = getattr(response, 'export_user', None)
+    if user is None:
+        return response
+    return FileResponse(
+        await run_in_thread(spool_export, user, request),
+        as_attachment=True, filename=FILE_NAME, content_type=CONTENT_TYPE)
@@ -0,0 +1,116 @@
+"""Кеш выборок по рецептам с версионными ключами.
+
+В ключ записи входит номер версии рецептов, который увеличивается после
+фиксации любого изменения рецептов или тэгов. Старые записи при этом не
+удаляются, а просто перестают читаться и вытесняются по времени жизни.
+Кеш берется из ``CACHES`` по алиасу ``RECIPE_CACHE``. Версия и
+блокировки пересчета должны быть видны всем процессам, поэтому в рабочем
+окружении это общий кеш (memcached): с кешем в памяти процесса изменение
+рецептов сбрасывает записи только в процессе, который его сделал, и
+``check`` об этом предупреждает.
+
+``get_or_revalidate`` хранит запись под постоянным ключом вместе с
+версией, при которой она посчитана. Устаревшую запись пересчитывает
+только один запрос, захвативший блокировку ключа; остальные тем временем
+получают прежнее значение, а если его нет - считают его сами.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import urlencode
+
+VERSION_KEY = 'recipes:version'
+
+
+def recipes_cache():
+    return caches[getattr(settings, 'RECIPE_CACHE', 'default')]
+
+
+def recipes_version():
+    """Текущая версия рецептов.
+
+    Если ключ версии вытеснен из кеша, отсчет начинается заново с
+    текущего времени в миллисекундах, чтобы не совпасть с прежними
+    версиями.
+    """
+    cache = recipes_cache()
+    version = cache.get(VERSION_KEY)
+    if version is not None:
+        return version
+    cache.add(VERSION_KEY, int(time.time() * 1000), None)
+    return cache.get(VERSION_KEY, 0)
+
+
+def bump(key):
+    """Увеличить счетчик версии ``key`` в кеше рецептов."""
+    cache = recipes_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), None)
+
+
+def bump_version():
+    bump(VERSION_KEY)
+
+
+def invalidate_recipes():
+    """Сделать устаревшими все записи кеша после фиксации транзакции."""
+    transaction.on_commit(bump_version)
+
+
+def query_signature(params, ignored=()):
+    """Хэш параметров запроса без учета их порядка."""
+    items = sorted(
+        (name, value)
+        for name, values in params.lists() if name not in ignored
+        for value in values
+    )
+    return hashlib.sha256(urlencode(items).encode()).hexdigest()
+
+
+def versioned_key(prefix, signature):
+    return f'{prefix}:{recipes_version()}:{signature}'
+
+
+def get_or_compute(prefix, signature, compute, timeout):
+    """Значение из кеша по ключу текущей версии или посчитанное
+    ``compute()``."""
+    cache = recipes_cache()
+    key = versioned_key(prefix, signature)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def get_or_revalidate(key, compute, timeout, stale_seconds, lock_seconds):
+    """Значение из кеша, которое пересчитывает только один запрос.
+
+    Запись свежая ``timeout`` секунд, пока не изменилась версия
+    рецептов, и хранится еще ``stale_seconds`` секунд, в течение которых
+    ее отдают, пока другой запрос считает новую. Если записи нет совсем,
+    запрос не ждет чужого пересчета, а считает значение сам.
+    """
+    cache = recipes_cache()
+    version = recipes_version()
+    entry = cache.get(key)
+    if (entry is not None and entry[0] == version
+            and entry[1] > time.time()):
+        return entry[2]
+    lock_key = key + ':lock'
+    if not cache.add(lock_key, True, lock_seconds):
+        if entry is not None:
+            return entry[2]
+        return compute()
+    try:
+        value = compute()
+        cache.set(key, (version, time.time() + timeout, value),
+                  timeout + stale_seconds)
+    finally:
+        cache.delete(lock_key)
+    return value
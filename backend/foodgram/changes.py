@@ -0,0 +1,140 @@
+"""Изменения рецептов для синхронизации клиентов.
+
+Клиент хранит курсор и запрашивает всё, что было создано, изменено или
+удалено после него. Созданные и измененные рецепты берутся по индексу
+(updated_at, id), удаленные - из ``RecipeTombstone`` по индексу
+(deleted_at, id); обе последовательности сливаются в одну по времени.
+Курсор - позиция последнего выданного изменения и время, по которое
+клиент получил все изменения.
+
+Изменения младше ``LAG_SECONDS`` не выдаются: транзакция, начатая
+раньше, может зафиксироваться позже и иначе была бы пропущена. Отметки
+об удалении хранятся ``TOMBSTONE_DAYS`` дней; клиенту, который не
+синхронизировался дольше, нужно загрузить рецепты заново. Клиент,
+дочитавший изменения, получает курсор с новым временем синхронизации,
+даже если изменений не было.
+"""
+import base64
+import heapq
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Recipe, RecipeTombstone
+
+CHANGED = 0
+DELETED = 1
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Курсор устарел, загрузите рецепты заново'
+    default_code = 'cursor_expired'
+
+
+def changes_setting(name, default):
+    return getattr(settings, f'RECIPE_CHANGES_{name}', default)
+
+
+def encode_cursor(moment, kind, item_id, synced):
+    raw = (f'{moment.isoformat()}|{kind}|{item_id}|'
+           f'{synced.isoformat()}').encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Разобрать курсор в позицию (время, вид изменения, id) и время
+    синхронизации.
+
+    В курсорах без времени синхронизации им считается время позиции.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        moment, kind, item_id, *synced = raw.split('|')
+        moment = parse_datetime(moment)
+        synced = parse_datetime(synced[0]) if synced else moment
+        kind = int(kind)
+        item_id = int(item_id)
+    except (ValueError, UnicodeError, IndexError):
+        moment = synced = None
+    if moment is None or synced is None or kind not in (CHANGED, DELETED):
+        raise ValidationError({'cursor': 'Некорректный курсор'})
+    return (moment, kind, item_id), synced
+
+
+def after(field, own_kind, position):
+    """Условие «позже позиции курсора» для изменений вида ``own_kind``."""
+    moment, kind, item_id = position
+    condition = Q(**{f'{field}__gt': moment})
+    if own_kind > kind:
+        condition |= Q(**{field: moment})
+    elif own_kind == kind:
+        condition |= Q(**{field: moment, 'pk__gt': item_id})
+    return condition
+
+
+def read_changes(cursor=None, limit=100):
+    """Прочитать пачку изменений после курсора.
+
+    Возвращает id созданных или измененных рецептов, id удаленных
+    рецептов, курсор для следующего запроса и признак того, что
+    изменения после него еще есть.
+    """
+    now = timezone.now()
+    horizon = now - timedelta(seconds=changes_setting('LAG_SECONDS', 5))
+    recipes = Recipe.objects.filter(updated_at__lte=horizon)
+    tombstones = RecipeTombstone.objects.filter(deleted_at__lte=horizon)
+    position = None
+    if cursor:
+        position, synced = decode_cursor(cursor)
+        expires = timedelta(days=changes_setting('TOMBSTONE_DAYS', 30))
+        if synced < now - expires:
+            raise CursorExpired
+        recipes = recipes.filter(after('updated_at', CHANGED, position))
+        tombstones = tombstones.filter(
+            after('deleted_at', DELETED, position))
+    recipes = recipes.order_by('updated_at', 'pk').values_list(
+        'updated_at', 'pk')[:limit + 1]
+    tombstones = tombstones.order_by('deleted_at', 'pk').values_list(
+        'deleted_at', 'pk', 'recipe_id')[:limit + 1]
+    batch = list(islice(heapq.merge(
+        ((moment, CHANGED, pk, pk) for moment, pk in recipes),
+        ((moment, DELETED, pk, recipe_id)
+         for moment, pk, recipe_id in tombstones),
+    ), limit + 1))
+    has_more = len(batch) > limit
+    batch = batch[:limit]
+    if batch:
+        position = batch[-1][:3]
+    elif position is None:
+        # Изменений еще не было: курсор указывает на горизонт, и
+        # следующий запрос не начинает чтение заново.
+        position = (horizon, CHANGED, 0)
+    # Если изменения за позицией еще есть, клиент получил все только по
+    # время позиции, иначе - по горизонт.
+    cursor = encode_cursor(*position, position[0] if has_more else horizon)
+    changed = [item[3] for item in batch if item[1] == CHANGED]
+    deleted = [item[3] for item in batch if item[1] == DELETED]
+    return changed, deleted, cursor, has_more
+
+
+def start_cursor():
+    """Курсор, после которого ``read_changes`` выдаст все изменения, не
+    попавшие в выборку, начатую сейчас."""
+    moment = timezone.now() - timedelta(
+        seconds=changes_setting('LAG_SECONDS', 5))
+    return encode_cursor(moment, CHANGED, 0, moment)
+
+
+def prune_tombstones():
+    """Удалить устаревшие отметки об удалении. Возвращает их число."""
+    expires = timedelta(days=changes_setting('TOMBSTONE_DAYS', 30))
+    deleted, _ = RecipeTombstone.objects.filter(
+        deleted_at__lt=timezone.now() - expires).delete()
+    return deleted
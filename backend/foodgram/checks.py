@@ -0,0 +1,63 @@
+"""Проверки настроек, которые ``manage.py check`` выполняет при запуске.
+
+Состояние, общее для всех процессов (слоты pdf, корзины ограничения
+частоты, версия кеша рецептов, закрепление за основной базой), хранится
+в кеше. Кеш в памяти процесса у каждого процесса свой: ограничения
+действуют на каждый процесс отдельно, записи кеша рецептов сбрасываются
+только в процессе, изменившем рецепты, а клиент, закрепленный за
+основной базой в одном процессе, в другом читает с реплики и не видит
+своих изменений. Последнее нарушает гарантию роутера, поэтому с
+репликами это ошибка.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Warning, register
+from foodgram_api.db_router import pin_cache, routing_setting
+
+from .throttling import CacheBucketStore, get_store, throttle_setting
+
+
+def is_local(cache):
+    return isinstance(cache, (LocMemCache, DummyCache))
+
+
+def shared_cache_uses():
+    """Пары (алиас кеша, что в нем хранится) для общего состояния."""
+    uses = [
+        (throttle_setting('CACHE'), 'слоты отрисовки pdf'),
+        (getattr(settings, 'RECIPE_CACHE', 'default'),
+         'версии кеша рецептов и тэгов'),
+    ]
+    if isinstance(get_store(), CacheBucketStore):
+        uses.append(
+            (throttle_setting('CACHE'), 'корзины ограничения частоты'))
+    return uses
+
+
+@register()
+def check_shared_caches(app_configs, **kwargs):
+    return [
+        Warning(
+            f'{purpose.capitalize()} хранятся в кеше {alias!r} в памяти '
+            'процесса и не видны остальным процессам.',
+            hint='Задайте общий кеш в CACHE_BACKEND и CACHE_LOCATION.',
+            id='foodgram.W001',
+        )
+        for alias, purpose in shared_cache_uses()
+        if is_local(caches[alias])
+    ]
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    if not routing_setting('REPLICAS') or not is_local(pin_cache()):
+        return []
+    return [Error(
+        'Закрепление за основной базой хранится в кеше '
+        f'{routing_setting("CACHE")!r} в памяти процесса: после записи '
+        'клиент может читать с реплики в другом процессе.',
+        hint='Задайте общий кеш в CACHE_BACKEND и CACHE_LOCATION.',
+        id='foodgram.E001',
+    )]
@@ -6,3 +6,20 @@ class RetrieveListViewSet(mixins.RetrieveModelMixin,
                           viewsets.GenericViewSet):
 
     pass
+
+
+class FastDeleteAdminMixin:
+    """Страница подтверждения удаления без сбора всех связанных строк.
+
+    Стандартная страница загружает каждую связанную строку, чтобы
+    перечислить их; для автора с тысячами рецептов это слишком долго.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            set(),
+            [],
+        )
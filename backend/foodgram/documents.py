@@ -0,0 +1,185 @@
+"""Готовые JSON-документы рецептов.
+
+Публичное представление рецепта (автор, тэги, ингредиенты, адрес
+изображения и т.д.) хранится в ``RecipeDocument`` уже закодированным в
+JSON. Документ разрезан на фрагменты по местам, которые зависят от
+запроса: отметкам пользователя (``author.is_subscribed``,
+``is_favorited``, ``is_in_shopping_cart``) и абсолютным адресам
+изображения и его копий. При чтении фрагменты склеиваются с этими значениями.
+
+Документ пересобирается в одной транзакции с записью рецепта. При
+изменении автора, ингредиента или тэга документы затронутых рецептов
+удаляются, а после фиксации транзакции пересобираются в фоне; до этого
+недостающие документы собираются при чтении. Дата изменения таких
+рецептов сдвигается, чтобы клиенты получили их при синхронизации.
+"""
+import threading
+from collections import defaultdict
+
+import orjson
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import invalidate_recipes
+from .image_urls import (absolute_url, absolute_variant_urls, image_path,
+                         variant_paths)
+from .models import IngredientInRecipe, Recipe, RecipeDocument
+from .renderers import UNICODE_LINE_SEPARATORS
+
+User = get_user_model()
+
+SEPARATOR = b'\0'
+REBUILD_CHUNK_SIZE = 1000
+
+
+def dumps(value):
+    """Закодировать значение так же, как ``JSONRenderer``."""
+    ret = orjson.dumps(value)
+    for char, escaped in UNICODE_LINE_SEPARATORS:
+        ret = ret.replace(char, escaped)
+    return ret
+
+
+def members(*pairs):
+    return b','.join(dumps(key) + b':' + dumps(value) for key, value in pairs)
+
+
+def recipe_authors(author_ids):
+    """Поля авторов без отметки подписки: id -> словарь."""
+    return {
+        row['id']: row for row in User.objects.filter(
+            pk__in=author_ids
+        ).order_by().values(
+            'email', 'id', 'username', 'first_name', 'last_name')
+    }
+
+
+def recipe_tags(recipe_ids):
+    """Тэги рецептов: id рецепта -> список словарей в порядке id тэга."""
+    tags = defaultdict(list)
+    for recipe_id, *tag in Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids
+    ).order_by('tag_id').values_list(
+            'recipe_id', 'tag__id', 'tag__name', 'tag__color', 'tag__slug'):
+        tags[recipe_id].append(dict(zip(('id', 'name', 'color', 'slug'), tag)))
+    return tags
+
+
+def recipe_ingredients(recipe_ids):
+    """Ингредиенты рецептов: id рецепта -> список словарей."""
+    ingredients = defaultdict(list)
+    for recipe_id, *ingredient in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+    ).values_list(
+            'recipe_id', 'id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'):
+        ingredients[recipe_id].append(dict(zip(
+            ('id', 'name', 'measurement_unit', 'amount'), ingredient)))
+    return ingredients
+
+
+def build_documents(recipe_ids):
+    """Собрать документы рецептов. Возвращает словарь id -> документ."""
+    recipes = list(Recipe.objects.filter(pk__in=recipe_ids).order_by(
+    ).values_list(
+        'id', 'author_id', 'name', 'image', 'image_variants', 'text',
+        'cooking_time'))
+    authors = recipe_authors({recipe[1] for recipe in recipes})
+    tags = recipe_tags(recipe_ids)
+    ingredients = recipe_ingredients(recipe_ids)
+    documents = {}
+    for (recipe_id, author_id, name, image, image_variants, text,
+         cooking_time) in recipes:
+        documents[recipe_id] = SEPARATOR.join((
+            b'{' + members(('id', recipe_id)) + b',"author":{'
+            + members(*authors[author_id].items()) + b',"is_subscribed":',
+            b'},' + members(('name', name)) + b',"image":',
+            dumps([image_path(image), variant_paths(image, image_variants)]),
+            b',' + members(
+                ('text', text),
+                ('ingredients', ingredients[recipe_id]),
+                ('tags', tags[recipe_id]),
+                ('cooking_time', cooking_time),
+            ) + b',"is_favorited":',
+        ))
+    return documents
+
+
+def save_documents(documents):
+    with transaction.atomic():
+        RecipeDocument.objects.filter(recipe_id__in=documents).delete()
+        RecipeDocument.objects.bulk_create(
+            RecipeDocument(recipe_id=recipe_id, document=document)
+            for recipe_id, document in documents.items()
+        )
+
+
+def refresh_documents(recipe_ids):
+    """Пересобрать документы рецептов в текущей транзакции."""
+    save_documents(build_documents(recipe_ids))
+    invalidate_recipes()
+
+
+def get_documents(recipe_ids):
+    """Получить документы рецептов, собрав недостающие."""
+    documents = {
+        recipe_id: bytes(document)
+        for recipe_id, document in RecipeDocument.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'document')
+    }
+    missing = [
+        recipe_id for recipe_id in recipe_ids if recipe_id not in documents]
+    if missing:
+        built = build_documents(missing)
+        RecipeDocument.objects.bulk_create(
+            (RecipeDocument(recipe_id=recipe_id, document=document)
+             for recipe_id, document in built.items()),
+            ignore_conflicts=True
+        )
+        documents.update(built)
+    return documents
+
+
+def render_document(document, request, is_subscribed, is_favorited,
+                    is_in_shopping_cart):
+    """Склеить документ с данными запроса в JSON рецепта."""
+    head, middle, images, tail = document.split(SEPARATOR)
+    image, variants = orjson.loads(images)
+    return b''.join((
+        head, dumps(is_subscribed), middle,
+        dumps(absolute_url(image, request) if image else None),
+        b',"image_variants":',
+        dumps(absolute_variant_urls(variants, request)), tail,
+        dumps(is_favorited), b',"is_in_shopping_cart":',
+        dumps(is_in_shopping_cart), b'}',
+    ))
+
+
+def rebuild_in_background(recipe_ids):
+    def rebuild():
+        try:
+            for start in range(0, len(recipe_ids), REBUILD_CHUNK_SIZE):
+                refresh_documents(
+                    recipe_ids[start:start + REBUILD_CHUNK_SIZE])
+        finally:
+            connection.close()
+
+    threading.Thread(target=rebuild, daemon=True).start()
+
+
+def invalidate_documents(recipes):
+    """Удалить документы рецептов и пересобрать их в фоне после коммита.
+
+    ``recipes`` - queryset рецептов, документы которых устарели.
+    """
+    recipe_ids = list(
+        recipes.order_by().values_list('pk', flat=True).distinct())
+    if not recipe_ids:
+        return
+    RecipeDocument.objects.filter(recipe__in=recipes).delete()
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now())
+    invalidate_recipes()
+    transaction.on_commit(lambda: rebuild_in_background(recipe_ids))
@@ -0,0 +1,139 @@
+"""Поток server-sent events о новых рецептах авторов из подписок.
+
+Поток отдается отдельным ASGI-приложением, которое стоит перед Django:
+Django 3.2 не умеет отдавать асинхронный потоковый ответ. Работает
+только в режиме ASGI (``foodgram_api.asgi:application``).
+
+На соединение приходится одна подписка с очередью не длиннее
+``RECIPE_EVENTS_QUEUE_SIZE`` сообщений, а сами сообщения общие для всех
+получателей. Простаивающему клиенту раз в ``HEARTBEAT_SECONDS`` секунд
+уходит комментарий, чтобы прокси не закрывали соединение. Клиент,
+который не забирает данные, отключается: при переполнении очереди (с
+событием ``overflow``) или если отправка не завершилась за
+``SEND_TIMEOUT_SECONDS`` секунд. Соединений в процессе не больше
+``RECIPE_EVENTS_MAX_CONNECTIONS``.
+"""
+import asyncio
+
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from users.authentication import CachedTokenAuthentication
+
+from .documents import dumps
+from .events import Subscription, author_channel, events_setting, get_broker
+from .models import Follow
+from .offload import run_in_thread
+
+HEARTBEAT = b': ping\n\n'
+OVERFLOW = b'event: overflow\ndata: {}\n\n'
+
+
+def authenticate(headers):
+    """Пользователь по заголовку ``Authorization: Token <ключ>``."""
+    authorization = headers.get(b'authorization', b'').split()
+    if len(authorization) != 2 or authorization[0].lower() != b'token':
+        return AnonymousUser()
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(
+            authorization[1].decode())
+    except (AuthenticationFailed, UnicodeError):
+        return AnonymousUser()
+    return user
+
+
+def followed_authors(user):
+    return list(Follow.objects.filter(
+        user=user).values_list('author_id', flat=True))
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class EventStreamApp:
+    """ASGI-приложение: поток событий по ``RECIPE_EVENTS_PATH``,
+    остальные запросы передаются в ``app``."""
+
+    def __init__(self, app):
+        self.app = app
+        self.connections = 0
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or scope['path'] != events_setting(
+                'PATH', '/api/recipes/events/')):
+            return await self.app(scope, receive, send)
+        if scope['method'] != 'GET':
+            return await self.respond(
+                send, 405, 'Метод не разрешен', [(b'allow', b'GET')])
+        if self.connections >= events_setting('MAX_CONNECTIONS', 10000):
+            return await self.respond(
+                send, 503, 'Слишком много соединений',
+                [(b'retry-after', b'5')])
+        self.connections += 1
+        try:
+            user = await run_in_thread(authenticate, dict(scope['headers']))
+            if user.is_anonymous:
+                return await self.respond(
+                    send, 401, 'Учетные данные не были предоставлены.')
+            author_ids = await run_in_thread(followed_authors, user)
+            await self.stream(receive, send, author_ids)
+        finally:
+            self.connections -= 1
+
+    @staticmethod
+    async def respond(send, status, detail, headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), *headers],
+        })
+        await send({
+            'type': 'http.response.body', 'body': dumps({'detail': detail})})
+
+    async def stream(self, receive, send, author_ids):
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(
+            loop, events_setting('QUEUE_SIZE', 32))
+        channels = [author_channel(author_id) for author_id in author_ids]
+        broker = get_broker()
+        broker.subscribe(subscription, channels)
+        disconnected = loop.create_task(wait_disconnect(receive))
+        getter = None
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            message = b'retry: %d\n\n' % events_setting('RETRY_MS', 5000)
+            while message is not None:
+                await asyncio.wait_for(
+                    send({'type': 'http.response.body', 'body': message,
+                          'more_body': True}),
+                    events_setting('SEND_TIMEOUT_SECONDS', 30))
+                if getter is None:
+                    getter = loop.create_task(subscription.get())
+                done, _ = await asyncio.wait(
+                    (getter, disconnected),
+                    timeout=events_setting('HEARTBEAT_SECONDS', 15),
+                    return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    return
+                if getter not in done:
+                    message = HEARTBEAT
+                    continue
+                message = getter.result()
+                getter = None
+            await send({'type': 'http.response.body', 'body': OVERFLOW})
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            broker.unsubscribe(subscription, channels)
+            disconnected.cancel()
+            if getter is not None:
+                getter.cancel()
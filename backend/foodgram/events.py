@@ -0,0 +1,119 @@
+"""Рассылка событий о новых рецептах подписчикам автора.
+
+После фиксации транзакции, создавшей рецепт, событие публикуется в
+канал автора. Соединения потока событий (см. ``event_stream``)
+подписаны на каналы авторов из подписок пользователя.
+
+Брокер подключаемый: класс задается в ``RECIPE_EVENTS_BROKER``. Брокер
+в памяти процесса (``LocalBroker``) доставляет события только
+соединениям того же процесса; для нескольких процессов нужен брокер
+поверх общей шины с теми же методами ``publish``, ``subscribe`` и
+``unsubscribe``.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .documents import dumps
+
+_lock = threading.Lock()
+_brokers = {}
+
+
+def events_setting(name, default):
+    return getattr(settings, f'RECIPE_EVENTS_{name}', default)
+
+
+def author_channel(author_id):
+    return f'author:{author_id}'
+
+
+class Subscription:
+    """Подписка одного соединения с очередью ограниченного размера.
+
+    Сообщения могут приходить из любого потока. Если клиент не успевает
+    их забирать и очередь переполняется, очередь очищается и в нее
+    кладется ``None``: соединение должно закрыться, а клиент - загрузить
+    пропущенное через ``/api/recipes/changes/``.
+    """
+
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Цикл событий соединения уже закрыт.
+            pass
+
+    def _put(self, message):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class LocalBroker:
+    """Брокер в памяти процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    def subscribe(self, subscription, channels):
+        with self._lock:
+            for channel in channels:
+                self._channels[channel].add(subscription)
+
+    def unsubscribe(self, subscription, channels):
+        with self._lock:
+            for channel in channels:
+                subscriptions = self._channels.get(channel)
+                if subscriptions is None:
+                    continue
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[channel]
+
+
+def get_broker():
+    path = events_setting('BROKER', 'foodgram.events.LocalBroker')
+    with _lock:
+        if path not in _brokers:
+            _brokers[path] = import_string(path)()
+    return _brokers[path]
+
+
+def recipe_event(recipe):
+    """Событие SSE о новом рецепте: id, автор и название."""
+    data = dumps({
+        'id': recipe.pk, 'author': recipe.author_id, 'name': recipe.name})
+    return b'id: %d\nevent: recipe\ndata: %s\n\n' % (recipe.pk, data)
+
+
+def publish_recipe(recipe):
+    """Разослать событие о новом рецепте после фиксации транзакции."""
+    message = recipe_event(recipe)
+    channel = author_channel(recipe.author_id)
+    transaction.on_commit(lambda: get_broker().publish(channel, message))
@@ -0,0 +1,73 @@
+"""Выгрузка рецептов, избранного и списка покупок пользователя в NDJSON.
+
+Первая строка выгрузки описывает пользователя, дальше по строке на
+рецепт: ``{"type": "recipe" | "favorite" | "shopping_cart",
+"recipe": {...}}``. Id рецептов читаются итератором (в PostgreSQL -
+серверным курсором) пачками по ``RECIPE_EXPORT_CHUNK_SIZE``, а поля
+рецептов, ингредиенты и тэги догружаются несколькими запросами на
+пачку. Строки пишутся в ответ или файл сразу, поэтому память не
+зависит от размера выгрузки.
+"""
+from itertools import islice
+
+from django.conf import settings
+
+from .documents import dumps
+from .fast_list import recipe_fields_items
+from .models import Favorite, Recipe, ShoppingCart
+
+CONTENT_TYPE = 'application/x-ndjson'
+FILE_NAME = 'recipes.ndjson'
+EXPORT_FIELDS = (
+    'id', 'author', 'name', 'image', 'text', 'ingredients', 'tags',
+    'cooking_time')
+
+
+def chunk_size():
+    return getattr(settings, 'RECIPE_EXPORT_CHUNK_SIZE', 500)
+
+
+def export_sections(user):
+    """Пары (тип строки, id рецептов раздела)."""
+    return (
+        ('recipe', Recipe.objects.filter(author=user)
+         .order_by('pk').values_list('pk', flat=True)),
+        ('favorite', Favorite.objects.filter(user=user)
+         .order_by('pk').values_list('recipe_id', flat=True)),
+        ('shopping_cart', ShoppingCart.objects.filter(user=user)
+         .order_by('pk').values_list('recipe_id', flat=True)),
+    )
+
+
+def chunks(iterator, size):
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def export_lines(user, request=None):
+    """Выгрузка пользователя по частям: строки NDJSON пачки рецептов."""
+    yield dumps({'type': 'user', 'user': {
+        'id': user.pk,
+        'email': user.email,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+    }}) + b'\n'
+    size = chunk_size()
+    for kind, recipe_ids in export_sections(user):
+        for chunk in chunks(recipe_ids.iterator(chunk_size=size), size):
+            items, _ = recipe_fields_items(chunk, request, EXPORT_FIELDS)
+            yield b''.join(
+                dumps({'type': kind, 'recipe': items[recipe_id]}) + b'\n'
+                for recipe_id in chunk if recipe_id in items
+            )
+
+
+def write_export(users, file, request=None):
+    """Записать выгрузку пользователей ``users`` в файл ``file``."""
+    for user in users:
+        for part in export_lines(user, request):
+            file.write(part)
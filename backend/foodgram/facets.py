@@ -0,0 +1,106 @@
+"""Счетчики рецептов по тэгам и авторам для текущих фильтров.
+
+Счетчики тэгов считаются одним запросом с группировкой по
+``Recipe.tags_mask``: различных масок немного, и число рецептов с
+каждым тэгом складывается из них без join'а с таблицей связей. Тэги без
+бита в маске считаются отдельным запросом по таблице связей.
+Счетчики авторов - один запрос с группировкой по автору, выводятся
+``MAX_AUTHOR_FACETS`` самых частых.
+
+Счетчики тэгов дизъюнктивные: считаются по рецептам, отобранным всеми
+фильтрами, кроме самих тэгов, - так у каждого тэга видно, сколько
+рецептов он добавит к выборке.
+
+Каждый счетчик кешируется по своему набору фильтров (см. ``cache``) на
+``RECIPE_FACETS_TIMEOUT`` секунд. Фильтры по избранному и списку
+покупок зависят от пользователя, такие счетчики не кешируются.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count
+
+from .cache import get_or_compute, query_signature
+from .models import Recipe
+from .tag_mask import get_tags
+
+FACETS = ('tags', 'author')
+MAX_AUTHOR_FACETS = 20
+# Параметры, которые не влияют на набор рецептов.
+IGNORED_PARAMS = ('page', 'limit', 'fields', 'compact', 'facets')
+USER_PARAMS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def linked_counts(queryset, tag_ids):
+    """Число рецептов ``queryset`` с каждым из тэгов ``tag_ids``."""
+    if not tag_ids:
+        return {}
+    return dict(Recipe.tags.through.objects.filter(
+        recipe__in=queryset.order_by().values('pk'), tag__in=tag_ids
+    ).values_list('tag').annotate(count=Count('pk')).order_by())
+
+
+def tag_facets(queryset):
+    masks = queryset.order_by().values_list(
+        'tags_mask').annotate(count=Count('pk'))
+    counts = Counter()
+    for mask, count in masks:
+        counts[mask] += count
+    tags = get_tags()
+    linked = linked_counts(
+        queryset, [pk for pk, bit in tags.values() if bit is None])
+    return [
+        {
+            'id': pk,
+            'slug': slug,
+            'count': linked.get(pk, 0) if bit is None else sum(
+                count for mask, count in counts.items() if mask >> bit & 1),
+        }
+        for slug, (pk, bit) in tags.items()
+    ]
+
+
+def author_facets(queryset):
+    return [
+        {'id': author_id, 'count': count}
+        for author_id, count in queryset.order_by().values_list(
+            'author_id').annotate(count=Count('pk')).order_by(
+                '-count', 'author_id')[:MAX_AUTHOR_FACETS]
+    ]
+
+
+FACET_BUILDERS = {'tags': tag_facets, 'author': author_facets}
+# Параметры, без которых считается каждый счетчик: счетчики тэгов
+# дизъюнктивные - сколько рецептов дал бы каждый тэг при остальных
+# фильтрах, поэтому выбранные тэги на них не влияют.
+FACET_EXCLUDED_PARAMS = {'tags': ('tags',)}
+
+
+def facet(name, queryset, params):
+    """Счетчик ``name`` для рецептов ``queryset``, отобранных по
+    параметрам запроса ``params`` без ``FACET_EXCLUDED_PARAMS``."""
+    def compute():
+        return FACET_BUILDERS[name](queryset)
+
+    if any(params.get(param) for param in USER_PARAMS):
+        return compute()
+    return get_or_compute(
+        'recipe-facets:' + name,
+        query_signature(
+            params, IGNORED_PARAMS + FACET_EXCLUDED_PARAMS.get(name, ())),
+        compute,
+        getattr(settings, 'RECIPE_FACETS_TIMEOUT', 300)
+    )
+
+
+def recipe_facets(querysets, names, params):
+    """Счетчики ``names`` по параметрам запроса ``params``.
+
+    ``querysets(excluded)`` возвращает рецепты, отобранные по параметрам
+    без ``excluded``.
+    """
+    return {
+        name: facet(
+            name, querysets(FACET_EXCLUDED_PARAMS.get(name, ())), params)
+        for name in names
+    }
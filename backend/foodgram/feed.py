@@ -0,0 +1,149 @@
+"""Лента рецептов от авторов, на которых подписан пользователь.
+
+Лента гибридная. Новые рецепты обычных авторов при публикации
+раскладываются по лентам подписчиков (``TimelineEntry``), и страница
+ленты читается одним диапазонным сканом по индексу
+(user, -pub_date, -recipe). Рецепты авторов с очень большим числом
+подписчиков или публикаций не раскладываются: такие авторы отмечаются
+в ``FeedPullAuthor``, а их рецепты подмешиваются при чтении.
+"""
+import base64
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import FeedPullAuthor, Follow, Recipe, TimelineEntry
+
+
+def feed_setting(name, default):
+    return getattr(settings, f'FEED_{name}', default)
+
+
+def encode_cursor(pub_date, recipe_id):
+    raw = f'{pub_date.isoformat()}|{recipe_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Разобрать курсор ленты в пару (дата публикации, id рецепта)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        pub_date, recipe_id = raw.rsplit('|', 1)
+        pub_date = parse_datetime(pub_date)
+        recipe_id = int(recipe_id)
+    except (ValueError, UnicodeError):
+        pub_date = None
+    if pub_date is None:
+        raise ValidationError({'cursor': 'Некорректный курсор'})
+    return pub_date, recipe_id
+
+
+def is_pull_author(author_id):
+    """Проверить, читаются ли рецепты автора из ленты при запросе.
+
+    Автор отмечается навсегда, как только у него становится слишком
+    много подписчиков или публикаций за сутки.
+    """
+    if FeedPullAuthor.objects.filter(author_id=author_id).exists():
+        return True
+    followers = Follow.objects.filter(author_id=author_id).count()
+    recent = Recipe.objects.filter(
+        author_id=author_id,
+        pub_date__gte=timezone.now() - timedelta(days=1)
+    ).count()
+    if (followers > feed_setting('FANOUT_MAX_FOLLOWERS', 10000)
+            or recent > feed_setting('FANOUT_MAX_DAILY_RECIPES', 50)):
+        FeedPullAuthor.objects.get_or_create(author_id=author_id)
+        return True
+    return False
+
+
+def fanout_recipe(recipe):
+    """Разложить новый рецепт по лентам подписчиков автора."""
+
+    def fanout():
+        if is_pull_author(recipe.author_id):
+            return
+        batch_size = feed_setting('FANOUT_BATCH', 1000)
+        followers = Follow.objects.filter(
+            author_id=recipe.author_id
+        ).values_list('user_id', flat=True)
+        batch = []
+        for user_id in followers.iterator(chunk_size=batch_size):
+            batch.append(TimelineEntry(
+                user_id=user_id, recipe_id=recipe.pk,
+                author_id=recipe.author_id, pub_date=recipe.pub_date
+            ))
+            if len(batch) == batch_size:
+                TimelineEntry.objects.bulk_create(
+                    batch, ignore_conflicts=True)
+                batch = []
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+    transaction.on_commit(fanout)
+
+
+def follow_author(user_id, author_id):
+    """Добавить в ленту последние рецепты автора после подписки."""
+    if FeedPullAuthor.objects.filter(author_id=author_id).exists():
+        return
+    recipes = Recipe.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')[:feed_setting('BACKFILL_RECIPES', 50)]
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                       author_id=author_id, pub_date=pub_date)
+         for recipe_id, pub_date in recipes),
+        ignore_conflicts=True
+    )
+
+
+def unfollow_author(user_id, author_id):
+    """Убрать из ленты рецепты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+
+
+def read_feed(user, cursor=None, limit=None):
+    """Прочитать страницу ленты.
+
+    Возвращает список id рецептов в порядке убывания даты публикации и
+    курсор следующей страницы (или None).
+    """
+    limit = max(limit or settings.REST_FRAMEWORK['PAGE_SIZE'], 1)
+    timeline = TimelineEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(author_id__in=Follow.objects.filter(
+        user=user, author__feed_pull__isnull=False
+    ).values('author_id'))
+    if cursor:
+        pub_date, recipe_id = decode_cursor(cursor)
+        timeline = timeline.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+        )
+        pulled = pulled.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=recipe_id)
+        )
+    timeline = timeline.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit + 1]
+    pulled = pulled.order_by('-pub_date', '-pk').values_list(
+        'pub_date', 'pk')[:limit + 1]
+    page = []
+    seen = set()
+    for pub_date, recipe_id in heapq.merge(timeline, pulled, reverse=True):
+        if recipe_id in seen:
+            continue
+        seen.add(recipe_id)
+        page.append((pub_date, recipe_id))
+        if len(page) > limit:
+            break
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(*page[-1])
+    return [recipe_id for _, recipe_id in page], next_cursor
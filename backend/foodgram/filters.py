@@ -1,6 +1,9 @@
+from django.db.models import Exists, F, OuterRef, Q
 from django_filters import rest_framework as filters
 
-from .models import Ingredient, Recipe, Tag
+from .models import Favorite, Ingredient, Recipe, ShoppingCart
+from .search import search_recipes
+from .tag_mask import get_tag_choices, slugs_mask
 
 
 class IngredientsFilter(filters.FilterSet):
@@ -12,10 +15,9 @@ class IngredientsFilter(filters.FilterSet):
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags',
     )
     is_favorited = filters.BooleanFilter(
         method='get_favorite',
@@ -23,19 +25,66 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_cart',
     )
+    search = filters.CharFilter(
+        method='get_search',
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'Популярные'),),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'author', 'tags', 'is_in_shopping_cart')
+        fields = ('is_favorited', 'author', 'tags', 'is_in_shopping_cart',
+                  'search', 'ordering')
+
+    def get_tags(self, queryset, name, value):
+        """Отфильтровать рецепты, у которых есть хотя бы один из тэгов.
+
+        Тэги с битом проверяются по маске, тэги без бита - подзапросом
+        EXISTS по таблице связей.
+        """
+        mask, unmasked = slugs_mask(value)
+        if not unmasked:
+            return queryset.annotate(
+                tag_hits=F('tags_mask').bitand(mask)
+            ).filter(tag_hits__gt=0)
+        return queryset.annotate(
+            tag_hits=F('tags_mask').bitand(mask),
+            tag_linked=Exists(Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__slug__in=unmasked)),
+        ).filter(Q(tag_hits__gt=0) | Q(tag_linked=True))
+
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию."""
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        """Популярные рецепты из заранее посчитанного списка."""
+        return queryset.filter(trending__isnull=False).order_by(
+            'trending__rank')
+
+    def filter_user_relation(self, queryset, model, annotation):
+        """Оставить рецепты, связанные с пользователем через ``model``.
+
+        Условие накладывается на пришедший queryset как EXISTS-подзапрос,
+        поэтому сочетается с остальными фильтрами в одном запросе.
+        """
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none()
+        return queryset.annotate(**{annotation: Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk'))
+        )}).filter(**{annotation: True})
 
     def get_favorite(self, queryset, name, value):
         if value:
-            return Recipe.objects.filter(
-                favorite_recipe__user=self.request.user
-            )
-        return Recipe.objects.all()
+            return self.filter_user_relation(
+                queryset, Favorite, 'in_favorites')
+        return queryset
 
     def get_cart(self, queryset, name, value):
         if value:
-            return Recipe.objects.filter(cart__user=self.request.user)
-        return Recipe.objects.all()
+            return self.filter_user_relation(
+                queryset, ShoppingCart, 'in_shopping_cart')
+        return queryset
@@ -0,0 +1,57 @@
+"""Адреса изображений рецептов и их уменьшенных копий."""
+from .models import Recipe
+
+
+def image_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def absolute_url(url, request=None):
+    if request is None:
+        return url
+    return request.build_absolute_uri(url)
+
+
+def image_path(name):
+    if not name:
+        return ''
+    return image_storage().url(name)
+
+
+def image_url(name, request=None):
+    if not name:
+        return None
+    return absolute_url(image_path(name), request)
+
+
+def current_variants(name, stored):
+    """Имена файлов копий, если они построены для файла ``name``."""
+    if not name or stored.get('source') != name:
+        return {}
+    return stored.get('variants', {})
+
+
+def variant_paths(name, stored):
+    """Адреса копий изображения: вариант -> формат -> адрес."""
+    storage = image_storage()
+    return {
+        variant: {
+            extension: storage.url(file_name)
+            for extension, file_name in formats.items()
+        }
+        for variant, formats in current_variants(name, stored).items()
+    }
+
+
+def absolute_variant_urls(paths, request=None):
+    return {
+        variant: {
+            extension: absolute_url(url, request)
+            for extension, url in urls.items()
+        }
+        for variant, urls in paths.items()
+    }
+
+
+def variant_urls(name, stored, request=None):
+    return absolute_variant_urls(variant_paths(name, stored), request)
@@ -0,0 +1,192 @@
+"""Фоновая подготовка копий изображений рецептов.
+
+После сохранения рецепта с новым изображением копии (см. ``thumbnails``)
+строятся вне запроса: файл читается и копии сохраняются в фоновом
+потоке, а пиксели обрабатываются в пуле процессов
+(``ASYNC_IMAGE_PROCESSES``). Затем копии записываются в
+``Recipe.image_variants`` вместе с именем исходного файла, и документ
+рецепта пересобирается.
+
+Копии, построенные для другого файла, не выводятся: пока новые копии
+не готовы, ``image_variants`` в ответах пуст и клиент берет ``image``.
+
+Файлы, на которые не ссылается ни один рецепт, удаляются, если они не
+изменялись ``RECIPE_IMAGE_RELEASE_GRACE_SECONDS`` секунд: хранилище
+обновляет время изменения файла, имя которого выдает новому рецепту,
+а рецепт с ним может быть еще не сохранен. Удаление недавно измененных
+файлов повторяется в фоне после этого срока.
+"""
+import logging
+import posixpath
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .documents import refresh_documents
+from .image_urls import image_storage
+from .models import Recipe
+from .offload import get_executor
+from .thumbnails import render_variants
+
+logger = logging.getLogger(__name__)
+
+
+def variant_name(name, variant, extension):
+    directory, file_name = posixpath.split(name)
+    stem = posixpath.splitext(file_name)[0]
+    return posixpath.join(
+        directory, 'variants', f'{stem}_{variant}.{extension}')
+
+
+def store_variants(name, rendered):
+    """Сохранить файлы копий. Возвращает их имена в хранилище."""
+    storage = image_storage()
+    return {
+        variant: {
+            extension: storage.save(
+                variant_name(name, variant, extension), ContentFile(content))
+            for extension, content in formats.items()
+        }
+        for variant, formats in rendered.items()
+    }
+
+
+def release_grace():
+    return getattr(settings, 'RECIPE_IMAGE_RELEASE_GRACE_SECONDS', 60)
+
+
+def is_released(name):
+    """Можно ли удалить файл изображения: на него не ссылается ни один
+    рецепт и он давно не выдавался новым рецептам."""
+    return not (
+        image_storage().is_recent(name, release_grace())
+        or Recipe.objects.filter(image=name).exists()
+    )
+
+
+def release_variants(source, variants, keep=()):
+    """Удалить файлы копий, если исходный файл больше не используется.
+
+    Хранилище раздает одинаковым файлам одно имя, поэтому копии общего
+    изображения принадлежат всем рецептам с ним.
+    """
+    if not source or not is_released(source):
+        return
+    storage = image_storage()
+    for formats in variants.values():
+        for file_name in formats.values():
+            if file_name not in keep:
+                storage.delete(file_name)
+
+
+def release_images(images):
+    """Удалить файлы изображений и их копий, на которые больше не
+    ссылается ни один рецепт.
+
+    ``images`` - пары (имя файла, ``image_variants``) удаленных
+    рецептов. Возвращает пары недавно измененных файлов, удаление
+    которых надо повторить позже.
+    """
+    storage = image_storage()
+    deferred = []
+    for name, stored in dict(images).items():
+        if not name or Recipe.objects.filter(image=name).exists():
+            continue
+        if storage.is_recent(name, release_grace()):
+            deferred.append((name, stored))
+            continue
+        if stored.get('source') == name:
+            release_variants(name, stored.get('variants', {}))
+        storage.delete(name)
+    return deferred
+
+
+def release_in_background(images):
+    def release():
+        try:
+            deferred = release_images(images)
+            if deferred:
+                connection.close()
+                time.sleep(release_grace())
+                release_images(deferred)
+        except Exception:
+            logger.exception('Не удалось удалить файлы изображений')
+        finally:
+            connection.close()
+
+    threading.Thread(target=release, daemon=True).start()
+
+
+def save_variants(recipe_id, name, variants):
+    """Записать копии рецепту, если его изображение не сменилось.
+
+    Возвращает True, если копии записаны. Иначе файлы копий удаляются,
+    если они никому больше не нужны.
+    """
+    new_names = {
+        file_name for formats in variants.values()
+        for file_name in formats.values()
+    }
+    with transaction.atomic():
+        previous = Recipe.objects.filter(
+            pk=recipe_id, image=name
+        ).values_list('image_variants', flat=True).first()
+        if previous is None:
+            saved = False
+        else:
+            Recipe.objects.filter(pk=recipe_id).update(
+                image_variants={'source': name, 'variants': variants},
+                updated_at=timezone.now()
+            )
+            refresh_documents([recipe_id])
+            saved = True
+    if saved:
+        release_variants(
+            previous.get('source'), previous.get('variants', {}),
+            keep=new_names)
+    else:
+        release_variants(name, variants)
+    return saved
+
+
+def build_variants(recipe_id, name):
+    """Построить и записать копии изображения ``name`` рецепта.
+
+    Если у другого рецепта с тем же файлом копии уже есть, они
+    переиспользуются.
+    """
+    shared = Recipe.objects.filter(
+        image=name, image_variants__source=name
+    ).values_list('image_variants', flat=True).first()
+    if shared is not None:
+        return save_variants(recipe_id, name, shared['variants'])
+    with image_storage().open(name) as source:
+        data = source.read()
+    rendered = get_executor('images').submit(render_variants, data).result()
+    return save_variants(recipe_id, name, store_variants(name, rendered))
+
+
+def build_in_background(recipe_id, name):
+    def build():
+        try:
+            build_variants(recipe_id, name)
+        except Exception:
+            logger.exception(
+                'Не удалось построить копии изображения рецепта %s',
+                recipe_id)
+        finally:
+            connection.close()
+
+    threading.Thread(target=build, daemon=True).start()
+
+
+def schedule_variants(recipe):
+    """Построить копии после коммита, если изображение сменилось."""
+    name = recipe.image.name
+    if not name or recipe.image_variants.get('source') == name:
+        return
+    transaction.on_commit(lambda: build_in_background(recipe.pk, name))
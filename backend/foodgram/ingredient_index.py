@@ -0,0 +1,280 @@
+"""Инвертированный индекс ингредиент -> рецепты для поиска по продуктам.
+
+Индекс живет в памяти процесса: для каждого ингредиента хранится
+отсортированный массив numpy с id рецептов, для каждого рецепта - число
+его ингредиентов. Индекс один раз строится из ``IngredientInRecipe`` в
+фоне, обновляется при записи рецептов в этом процессе и раз в
+``INGREDIENT_INDEX_REFRESH_SECONDS`` секунд дочитывает изменения других
+процессов из ленты изменений рецептов (см. ``changes``): перечитываются
+ингредиенты только измененных и удаленных рецептов. Заново индекс
+строится, только если курсор ленты устарел. Пока индекс не построен,
+поиск выполняется SQL-запросом.
+
+Поиск объединяет массивы выбранных ингредиентов и считает совпадения в
+numpy под блокировкой индекса, поэтому не видит наполовину примененных
+изменений; ранжирование - ``np.lexsort`` при первом обращении к
+странице.
+"""
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q
+
+from .changes import CursorExpired, read_changes, start_cursor
+from .models import IngredientInRecipe, Recipe
+
+BUILD_CHUNK_SIZE = 10000
+REFRESH_BATCH = 1000
+EMPTY = np.empty(0, np.int32)
+
+
+def grown(sizes, recipe_id):
+    """Массив размеров, дополненный нулями до индекса ``recipe_id``."""
+    missing = recipe_id + 1 - len(sizes)
+    if missing <= 0:
+        return sizes
+    return np.concatenate((sizes, np.zeros(missing, sizes.dtype)))
+
+
+class RankedRecipes:
+    """Ленивая последовательность (id рецепта, покрытие, недостающие).
+
+    Поддерживает ``len`` и срезы, поэтому ее можно отдавать пагинатору:
+    рецепты сортируются при первом обращении к странице.
+    """
+
+    def __init__(self, ids, hits, sizes):
+        self.ids = ids
+        self.hits = hits
+        self.sizes = sizes
+        self._order = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def order(self):
+        if self._order is None:
+            self._order = np.lexsort((
+                -self.ids, self.sizes - self.hits, -self.hits / self.sizes))
+        return self._order
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError('Индекс вне последовательности')
+            return self[key:key + 1][0]
+        positions = self.order()[key]
+        ids = self.ids[positions]
+        hits = self.hits[positions]
+        sizes = self.sizes[positions]
+        return list(zip(
+            ids.tolist(), (hits / sizes).tolist(), (sizes - hits).tolist()))
+
+
+class IngredientIndex:
+    """Индекс ингредиентов рецептов в памяти процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._sizes = None
+        self._cursor = None
+        self._synced_at = 0
+        self._building = False
+        self._pending = []
+
+    @property
+    def refresh_seconds(self):
+        return getattr(settings, 'INGREDIENT_INDEX_REFRESH_SECONDS', 60)
+
+    def is_built(self):
+        return self._postings is not None
+
+    def is_ready(self):
+        """Построен ли индекс. Заодно запускает сборку или дочитывание
+        изменений в фоне."""
+        if time.monotonic() - self._synced_at > self.refresh_seconds:
+            self.schedule_build()
+        return self.is_built()
+
+    def schedule_build(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            self._pending = []
+        threading.Thread(target=self._build_in_thread, daemon=True).start()
+
+    def _build_in_thread(self):
+        try:
+            if self._cursor is None:
+                self.build()
+            else:
+                try:
+                    self.refresh()
+                except CursorExpired:
+                    self.build()
+        finally:
+            with self._lock:
+                self._building = False
+                self._pending = []
+            connection.close()
+
+    def _swap(self, postings, sizes, cursor):
+        """Установить новое состояние индекса и повторить изменения,
+        пришедшие во время сборки. Вызывается под блокировкой."""
+        self._postings = postings
+        self._sizes = sizes
+        self._cursor = cursor
+        self._synced_at = time.monotonic()
+        pending, self._pending = self._pending, []
+        for args in pending:
+            self._apply(*args)
+
+    def build(self):
+        """Построить индекс заново по таблице ``IngredientInRecipe``."""
+        cursor = start_cursor()
+        postings = {}
+        sizes = array('H')
+        rows = IngredientInRecipe.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.iterator(
+                chunk_size=BUILD_CHUNK_SIZE):
+            posting = postings.get(ingredient_id)
+            if posting is None:
+                posting = postings[ingredient_id] = array('i')
+            posting.append(recipe_id)
+            missing = recipe_id + 1 - len(sizes)
+            if missing > 0:
+                sizes.frombytes(bytes(sizes.itemsize * missing))
+            sizes[recipe_id] += 1
+        postings = {
+            ingredient_id: np.frombuffer(posting, np.int32)
+            for ingredient_id, posting in postings.items()
+        }
+        sizes = np.array(sizes, np.uint16)
+        with self._lock:
+            self._swap(postings, sizes, cursor)
+
+    def refresh(self):
+        """Дочитать изменения рецептов после последней синхронизации."""
+        cursor = self._cursor
+        recipe_ids = set()
+        while True:
+            changed, deleted, cursor, has_more = read_changes(
+                cursor, REFRESH_BATCH)
+            recipe_ids.update(changed, deleted)
+            if not has_more:
+                break
+        rows = []
+        recipe_list = sorted(recipe_ids)
+        for start in range(0, len(recipe_list), BUILD_CHUNK_SIZE):
+            rows.extend(IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_list[start:start + BUILD_CHUNK_SIZE]
+            ).values_list('recipe_id', 'ingredient_id'))
+        with self._lock:
+            if recipe_ids:
+                self._replace(recipe_ids, rows)
+            self._swap(self._postings, self._sizes, cursor)
+
+    def _replace(self, recipe_ids, rows):
+        """Заменить ингредиенты рецептов ``recipe_ids`` парами (id
+        рецепта, id ингредиента) ``rows``."""
+        postings = self._postings
+        removed = np.array(sorted(recipe_ids), np.int32)
+        for ingredient_id, posting in postings.items():
+            stale = np.isin(posting, removed, assume_unique=True)
+            if stale.any():
+                postings[ingredient_id] = posting[~stale]
+        added = defaultdict(list)
+        sizes = grown(self._sizes, int(removed[-1]))
+        sizes[removed] = 0
+        for recipe_id, ingredient_id in rows:
+            added[ingredient_id].append(recipe_id)
+            sizes[recipe_id] += 1
+        for ingredient_id, new_ids in added.items():
+            postings[ingredient_id] = np.union1d(
+                postings.get(ingredient_id, EMPTY),
+                np.array(new_ids, np.int32))
+        self._sizes = sizes
+
+    def _apply(self, recipe_id, old_ids, new_ids):
+        postings = self._postings
+        for ingredient_id in set(old_ids) - set(new_ids):
+            posting = postings.get(ingredient_id)
+            if posting is not None:
+                postings[ingredient_id] = posting[posting != recipe_id]
+        for ingredient_id in new_ids:
+            posting = postings.get(ingredient_id, EMPTY)
+            position = np.searchsorted(posting, recipe_id)
+            if position == len(posting) or posting[position] != recipe_id:
+                postings[ingredient_id] = np.insert(
+                    posting, position, recipe_id)
+        self._sizes = grown(self._sizes, recipe_id)
+        self._sizes[recipe_id] = len(new_ids)
+
+    def update_recipe(self, recipe_id, old_ids=(), new_ids=()):
+        """Обновить рецепт в индексе после фиксации транзакции.
+
+        Удаленный рецепт передается с пустым ``new_ids``.
+        """
+        args = (recipe_id, tuple(old_ids), tuple(new_ids))
+
+        def apply():
+            with self._lock:
+                if self._building:
+                    self._pending.append(args)
+                if self._postings is not None:
+                    self._apply(*args)
+
+        transaction.on_commit(apply)
+
+    def search(self, ingredient_ids):
+        """Посчитать совпадения рецептов с набором ингредиентов."""
+        with self._lock:
+            postings = [
+                self._postings[ingredient_id]
+                for ingredient_id in set(ingredient_ids)
+                if ingredient_id in self._postings
+            ]
+            if not postings:
+                return RankedRecipes(EMPTY, EMPTY, EMPTY)
+            ids, hits = np.unique(
+                np.concatenate(postings), return_counts=True)
+            sizes = self._sizes[ids].astype(np.int64)
+        found = sizes > 0
+        return RankedRecipes(ids[found], hits[found], sizes[found])
+
+
+ingredient_index = IngredientIndex()
+
+
+def find_by_ingredients(ingredient_ids):
+    """Рецепты по имеющимся ингредиентам.
+
+    Возвращает последовательность кортежей (id рецепта, покрытие,
+    недостающие), упорядоченную по убыванию доли имеющихся ингредиентов,
+    затем по числу недостающих.
+    """
+    if ingredient_index.is_ready():
+        return ingredient_index.search(ingredient_ids)
+    return Recipe.objects.annotate(
+        total=Count('ingredientinrecipe'),
+        have=Count(
+            'ingredientinrecipe',
+            filter=Q(ingredientinrecipe__ingredient_id__in=ingredient_ids)
+        ),
+    ).filter(have__gt=0).annotate(
+        coverage=ExpressionWrapper(
+            F('have') * 1.0 / F('total'), output_field=FloatField()),
+        missing=F('total') - F('have'),
+    ).order_by('-coverage', 'missing', '-pk').values_list(
+        'pk', 'coverage', 'missing')
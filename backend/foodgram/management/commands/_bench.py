@@ -0,0 +1,158 @@
+"""Общие помощники для команд-бенчмарков.
+
+Бенчмарки наполняют базу синтетическими рецептами, поэтому запускать их
+можно только на отдельной, не рабочей базе.
+"""
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection, reset_queries
+from django.db.models import Max
+from foodgram.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from foodgram.tag_mask import tags_mask
+from foodgram.views import RecipeViewSet
+from rest_framework import mixins
+from rest_framework.renderers import JSONRenderer
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench'
+BATCH_SIZE = 10000
+
+
+class SerializerRecipeViewSet(RecipeViewSet):
+    """Рецепты через ``RecipeListSerializer`` и ``JSONRenderer``."""
+
+    renderer_classes = (JSONRenderer,)
+
+    def list(self, request, *args, **kwargs):
+        return mixins.ListModelMixin.list(self, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return mixins.RetrieveModelMixin.retrieve(
+            self, request, *args, **kwargs)
+
+
+def bench_view(viewset, actions):
+    """Представление вьюсета без ограничения частоты запросов и кеша
+    страниц."""
+    return viewset.as_view(actions, throttle_classes=(), cache_pages=False)
+
+
+def render_response(view, request, **kwargs):
+    """Выполнить представление и вернуть тело ответа."""
+    response = view(request, **kwargs)
+    response.render()
+    return response.content
+
+
+def get_bench_author():
+    """Получить (или создать) автора синтетических рецептов."""
+    author, _ = User.objects.get_or_create(
+        email=f'{BENCH_PREFIX}@example.com',
+        defaults={
+            'username': BENCH_PREFIX,
+            'first_name': BENCH_PREFIX,
+            'last_name': BENCH_PREFIX,
+        }
+    )
+    return author
+
+
+def get_bench_tags(count=6):
+    """Получить тэги для бенчмарка, создав недостающие."""
+    tags = list(Tag.objects.order_by('pk')[:count])
+    for num in range(len(tags), count):
+        tags.append(Tag.objects.create(
+            name=f'{BENCH_PREFIX}-{num}',
+            color=f'#{num:06x}',
+            slug=f'{BENCH_PREFIX}-{num}',
+        ))
+    return tags
+
+
+def get_bench_ingredients(count=200):
+    """Получить ингредиенты для бенчмарка, создав недостающие."""
+    existing = Ingredient.objects.count()
+    if existing < count:
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'{BENCH_PREFIX}-{num}', measurement_unit='г')
+            for num in range(existing, count)
+        )
+    return list(Ingredient.objects.order_by('pk')[:count])
+
+
+def seed_recipes(total, stdout=None, seed=0):
+    """Добавить синтетические рецепты, пока их не станет ``total``.
+
+    У каждого рецепта 1-3 тэга и 3-10 ингредиентов, выбранных
+    детерминированно по номеру рецепта.
+    """
+    author = get_bench_author()
+    tags = get_bench_tags()
+    ingredients = get_bench_ingredients()
+    existing = Recipe.objects.filter(author=author).count()
+    tag_through = Recipe.tags.through
+    for start in range(existing, total, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE, total)
+        chosen = {}
+        recipes = []
+        for num in range(start, stop):
+            rnd = random.Random(seed * 1000003 + num)
+            chosen[num] = (
+                rnd.sample(tags, rnd.randint(1, 3)),
+                rnd.sample(ingredients, rnd.randint(3, 10)),
+            )
+            recipes.append(Recipe(
+                author=author,
+                name=f'{BENCH_PREFIX} {num}',
+                text=f'{BENCH_PREFIX} {num}',
+                image=f'{BENCH_PREFIX}.jpg',
+                cooking_time=rnd.randint(1, 500),
+                tags_mask=tags_mask(chosen[num][0]),
+            ))
+        last_pk = Recipe.objects.aggregate(last_pk=Max('pk'))['last_pk']
+        Recipe.objects.bulk_create(recipes)
+        tag_rows = []
+        ingredient_rows = []
+        for pk, name in Recipe.objects.filter(
+                author=author, pk__gt=last_pk or 0).values_list('pk', 'name'):
+            recipe_tags, recipe_ingredients = chosen[int(name.split()[-1])]
+            tag_rows.extend(
+                tag_through(recipe_id=pk, tag_id=tag.pk)
+                for tag in recipe_tags
+            )
+            ingredient_rows.extend(
+                IngredientInRecipe(
+                    recipe_id=pk, ingredient_id=ingredient.pk, amount=1)
+                for ingredient in recipe_ingredients
+            )
+        tag_through.objects.bulk_create(tag_rows)
+        IngredientInRecipe.objects.bulk_create(ingredient_rows)
+        if stdout is not None:
+            stdout.write(f'Создано рецептов: {stop}')
+    return author
+
+
+def measure(func, repeat=5, clock=time.perf_counter):
+    """Выполнить ``func`` несколько раз.
+
+    Возвращает лучшее время по часам ``clock`` в миллисекундах и число
+    SQL-запросов за один прогон.
+    """
+    best = None
+    queries = 0
+    debug_cursor = connection.force_debug_cursor
+    connection.force_debug_cursor = True
+    try:
+        for _ in range(repeat):
+            reset_queries()
+            started = clock()
+            func()
+            elapsed = (clock() - started) * 1000
+            queries = len(connection.queries)
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        connection.force_debug_cursor = debug_cursor
+    return best, queries
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import time
+from urllib.parse import quote
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from ._bench import get_bench_author
+
+# Бенчмарк меряет пропускную способность, ограничение частоты мешает.
+BENCH_ENV = {
+    'THROTTLE_CAPACITY': str(10 ** 9),
+    'THROTTLE_REFILL_RATE': str(10 ** 9),
+    'RECIPE_PAGE_CACHE_TIMEOUT': '0',
+}
+
+SERVERS = {
+    'wsgi': ['foodgram_api.wsgi:application'],
+    'asgi': [
+        'foodgram_api.asgi:application',
+        '--worker-class', 'uvicorn.workers.UvicornWorker',
+    ],
+}
+
+
+async def fetch(reader, writer, request):
+    """Отправить запрос и прочитать ответ. Вернуть (статус, keep-alive)."""
+    writer.write(request)
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Сервер закрыл соединение')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    keep_alive = headers.get('connection', '').lower() != 'close'
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        keep_alive = False
+    return int(status_line.split()[1]), keep_alive
+
+
+async def client(port, requests, deadline, latencies, errors):
+    connection = None
+    index = 0
+    while time.monotonic() < deadline:
+        request = requests[index % len(requests)]
+        index += 1
+        started = time.monotonic()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection('127.0.0.1', port)
+            status, keep_alive = await fetch(*connection, request)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            errors.append(None)
+            connection = None
+            continue
+        latencies.append(time.monotonic() - started)
+        if status >= 500:
+            errors.append(status)
+        if not keep_alive:
+            connection[1].close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def load(port, requests, concurrency, duration):
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(
+        client(port, requests, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    return latencies, errors
+
+
+def wait_for_port(server, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'Сервер не запустился на порту {port}')
+
+
+class Command(BaseCommand):
+    help = ('Сравнить пропускную способность WSGI (синхронные воркеры '
+            'gunicorn) и ASGI (воркеры uvicorn) при множестве '
+            'одновременных соединений.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Адрес для запросов; можно указать несколько раз.')
+        parser.add_argument('--modes', default='wsgi,asgi')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [
+            '/api/recipes/', '/api/tags/', '/api/ingredients/?name=с']
+        token, _ = Token.objects.get_or_create(user=get_bench_author())
+        requests = [
+            (f'GET {quote(path, safe="/?=&")} HTTP/1.1\r\nHost: localhost\r\n'
+             f'Authorization: Token {token.key}\r\n\r\n').encode()
+            for path in paths
+        ]
+        for mode in options['modes'].split(','):
+            if mode not in SERVERS:
+                raise CommandError(f'Неизвестный режим: {mode}')
+            server = subprocess.Popen(
+                ['gunicorn', *SERVERS[mode],
+                 '--workers', str(options['workers']),
+                 '--bind', f'127.0.0.1:{options["port"]}',
+                 '--log-level', 'warning'],
+                env=dict(os.environ, **BENCH_ENV)
+            )
+            try:
+                wait_for_port(server, options['port'])
+                latencies, errors = asyncio.run(load(
+                    options['port'], requests,
+                    options['concurrency'], options['duration']))
+            finally:
+                server.terminate()
+                server.wait()
+            if not latencies:
+                raise CommandError(f'{mode}: ни один запрос не выполнен')
+            latencies.sort()
+            self.stdout.write(
+                f'{mode}: {len(latencies)} запросов, '
+                f'{len(latencies) / options["duration"]:.0f} rps, '
+                f'ошибок {len(errors)}, '
+                f'p50 {statistics.median(latencies) * 1000:.1f} мс, '
+                f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} мс'
+            )
@@ -0,0 +1,81 @@
+import random
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+from foodgram.filters import RecipeFilter
+from foodgram.models import Favorite, Recipe, ShoppingCart, Tag
+
+from ._bench import get_bench_author, measure, seed_recipes
+
+
+class LegacyRecipeFilter(RecipeFilter):
+    """Прежняя реализация: фильтры заново строят queryset с join'ом."""
+
+    def get_favorite(self, queryset, name, value):
+        if value:
+            return Recipe.objects.filter(
+                favorite_recipe__user=self.request.user
+            )
+        return Recipe.objects.all()
+
+    def get_cart(self, queryset, name, value):
+        if value:
+            return Recipe.objects.filter(cart__user=self.request.user)
+        return Recipe.objects.all()
+
+
+class Command(BaseCommand):
+    help = ('Сравнить комбинации фильтров рецептов в прежней реализации '
+            'и на EXISTS-подзапросах. Запускать только на тестовой базе!')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--favorites', type=int, default=2000)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        author = seed_recipes(options['recipes'], stdout=self.stdout)
+        user = get_bench_author()
+        recipe_ids = list(
+            Recipe.objects.filter(author=author).values_list('pk', flat=True)
+        )
+        rnd = random.Random(0)
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                (model(user=user, recipe_id=pk) for pk in rnd.sample(
+                    recipe_ids, min(options['favorites'], len(recipe_ids)))),
+                ignore_conflicts=True,
+            )
+        request = SimpleNamespace(user=user)
+        slugs = '&'.join(
+            f'tags={slug}' for slug in
+            Tag.objects.order_by('pk').values_list('slug', flat=True)[:2]
+        )
+        cases = (
+            ('избранное', 'is_favorited=1'),
+            ('корзина', 'is_in_shopping_cart=1'),
+            ('автор + тэги + избранное',
+             f'author={author.pk}&{slugs}&is_favorited=1'),
+            ('автор + тэги + избранное + корзина',
+             f'author={author.pk}&{slugs}&is_favorited=1'
+             '&is_in_shopping_cart=1'),
+        )
+        page_size = options['page_size']
+        for title, params in cases:
+            for label, filter_class in (('прежний', LegacyRecipeFilter),
+                                        ('EXISTS', RecipeFilter)):
+                def run():
+                    queryset = filter_class(
+                        QueryDict(params), queryset=Recipe.objects.all(),
+                        request=request
+                    ).qs
+                    return queryset.count(), list(queryset[:page_size])
+
+                count = run()[0]
+                elapsed, queries = measure(run, options['repeat'])
+                self.stdout.write(
+                    f'{title} [{label}]: {elapsed:.1f} мс, '
+                    f'запросов: {queries}, найдено: {count}'
+                )
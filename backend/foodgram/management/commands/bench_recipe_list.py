@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from foodgram.views import RecipeViewSet
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from ._bench import (SerializerRecipeViewSet, bench_view, get_bench_author,
+                     measure, render_response, seed_recipes)
+
+CARD_FIELDS = 'id,author,name,image,tags,cooking_time,is_favorited'
+
+
+class Command(BaseCommand):
+    help = ('Сравнить время отрисовки страницы списка рецептов через '
+            'сериализаторы DRF и через быстрый путь. '
+            'Запускать только на тестовой базе!')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--page-size', type=int, action='append',
+                            dest='page_sizes')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        seed_recipes(options['recipes'], stdout=self.stdout)
+        user = get_bench_author()
+        factory = APIRequestFactory()
+        view = bench_view(RecipeViewSet, {'get': 'list'})
+        views = (
+            ('сериализаторы DRF',
+             bench_view(SerializerRecipeViewSet, {'get': 'list'}), {}),
+            ('быстрый путь', view, {}),
+            ('поля карточки', view, {'fields': CARD_FIELDS}),
+            ('поля карточки, компактно', view,
+             {'fields': CARD_FIELDS, 'compact': 1}),
+        )
+        for page_size in options['page_sizes'] or [6, 50]:
+            for title, view, extra in views:
+                def run():
+                    request = factory.get(
+                        '/api/recipes/',
+                        {'limit': page_size, 'page': 2, **extra})
+                    force_authenticate(request, user)
+                    return render_response(view, request)
+
+                elapsed, queries = measure(run, options['repeat'])
+                cpu, _ = measure(run, options['repeat'], time.process_time)
+                size = len(run())
+                self.stdout.write(
+                    f'{page_size} на странице, {title}: {elapsed:.1f} мс, '
+                    f'CPU {cpu:.1f} мс, запросов: {queries}, '
+                    f'{size} байт')
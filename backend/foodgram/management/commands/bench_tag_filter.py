@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from foodgram.models import Recipe, Tag
+from foodgram.tag_mask import slugs_mask
+
+from ._bench import measure, seed_recipes
+
+
+class Command(BaseCommand):
+    help = ('Сравнить фильтр рецептов по нескольким тэгам через join '
+            'и через битовую маску. Запускать только на тестовой базе!')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--tags', type=int, default=2)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        seed_recipes(options['recipes'], stdout=self.stdout)
+        slugs = list(
+            Tag.objects.order_by('pk').values_list('slug', flat=True)
+        )[:options['tags']]
+        page_size = options['page_size']
+
+        def by_join():
+            list(Tag.objects.filter(slug__in=slugs))
+            queryset = Recipe.objects.filter(
+                Q(*[Q(tags__slug=slug) for slug in slugs], _connector=Q.OR)
+            ).distinct()
+            queryset.count()
+            list(queryset[:page_size])
+
+        def by_mask():
+            queryset = Recipe.objects.annotate(
+                tag_hits=F('tags_mask').bitand(slugs_mask(slugs)[0])
+            ).filter(tag_hits__gt=0)
+            queryset.count()
+            list(queryset[:page_size])
+
+        slugs_mask(slugs)
+        for title, func in (('join + DISTINCT', by_join),
+                            ('битовая маска', by_mask)):
+            elapsed, queries = measure(func, options['repeat'])
+            self.stdout.write(
+                f'{title}: {elapsed:.1f} мс, запросов: {queries}')
@@ -0,0 +1,75 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from foodgram.image_urls import image_storage
+from foodgram.images import save_variants, store_variants
+from foodgram.models import Recipe
+from foodgram.thumbnails import render_variants
+
+
+class Command(BaseCommand):
+    help = ('Построить копии изображений рецептов, у которых их нет. '
+            'Изображения обрабатываются параллельно в нескольких '
+            'процессах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--processes', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить копии и у рецептов, где они уже есть.')
+
+    def read_sources(self, recipes):
+        storage = image_storage()
+        sources = []
+        for recipe_id, name in recipes:
+            try:
+                with storage.open(name) as source:
+                    sources.append((recipe_id, name, source.read()))
+            except OSError as error:
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+        return sources
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        built = 0
+        executor = ProcessPoolExecutor(
+            max_workers=options['processes'],
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        with executor:
+            while True:
+                recipes = list(
+                    Recipe.objects.filter(pk__gt=last_pk).exclude(image='')
+                    .order_by('pk')
+                    .values_list('pk', 'image', 'image_variants')
+                    [:batch_size]
+                )
+                if not recipes:
+                    break
+                last_pk = recipes[-1][0]
+                sources = self.read_sources(
+                    (recipe_id, name)
+                    for recipe_id, name, stored in recipes
+                    if options['all'] or stored.get('source') != name
+                )
+                futures = [
+                    (recipe_id, name,
+                     executor.submit(render_variants, data))
+                    for recipe_id, name, data in sources
+                ]
+                for recipe_id, name, future in futures:
+                    try:
+                        rendered = future.result()
+                    except Exception as error:
+                        self.stderr.write(f'Рецепт {recipe_id}: {error}')
+                        continue
+                    built += save_variants(
+                        recipe_id, name, store_variants(name, rendered))
+                self.stdout.write(
+                    f'Просмотрено до id {last_pk}, построено: {built}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Копии изображений построены: {built}'))
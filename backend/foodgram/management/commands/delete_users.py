@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from foodgram.deletion import run_job
+from foodgram.models import DeletionJob, Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Удалить пользователей со всеми рецептами пачками, не '
+            'загружая связанные строки в память. Подходит и для '
+            'завершения прерванного фонового удаления.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='+', type=int)
+
+    def handle(self, *args, **options):
+        for user_id in options['user_ids']:
+            user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                raise CommandError(f'Пользователь {user_id} не найден')
+            job = DeletionJob.objects.create(
+                user_id=user.pk, email=user.email,
+                recipes_total=Recipe.objects.filter(author=user).count())
+            run_job(job, lambda deleted, job=job: self.stdout.write(
+                f'{job.email}: удалено рецептов {deleted} из '
+                f'{job.recipes_total}'))
+            self.stdout.write(self.style.SUCCESS(f'{job.email} удален'))
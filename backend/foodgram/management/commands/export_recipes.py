@@ -0,0 +1,33 @@
+import gzip
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from foodgram.export import write_export
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Выгрузить рецепты, избранное и список покупок пользователей '
+            'в NDJSON. Без id выгружаются все пользователи; файл с '
+            'расширением .gz сжимается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int)
+        parser.add_argument(
+            '--output', '-o',
+            help='Файл выгрузки, по умолчанию стандартный вывод.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user_ids']:
+            users = users.filter(pk__in=options['user_ids'])
+        output = options['output']
+        if output is None:
+            write_export(users.iterator(), sys.stdout.buffer)
+            return
+        opener = gzip.open if output.endswith('.gz') else open
+        with opener(output, 'wb') as file:
+            write_export(users.iterator(), file)
+        self.stderr.write(self.style.SUCCESS(f'Выгрузка записана в {output}'))
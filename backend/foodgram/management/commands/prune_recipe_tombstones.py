@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from foodgram.changes import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = ('Удалить отметки об удалении рецептов старше '
+            'RECIPE_CHANGES_TOMBSTONE_DAYS дней.')
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено отметок: {deleted}'))
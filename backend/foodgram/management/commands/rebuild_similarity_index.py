@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from foodgram.models import Recipe
+from foodgram.similarity import recipe_ingredient_sets, save_signatures
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать MinHash-сигнатуры и LSH-индекс всех рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        total = 0
+        while True:
+            recipe_ids = list(
+                Recipe.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not recipe_ids:
+                break
+            save_signatures(recipe_ids, recipe_ingredient_sets(recipe_ids))
+            last_pk = recipe_ids[-1]
+            total += len(recipe_ids)
+            self.stdout.write(f'Обработано рецептов: {total}')
+        self.stdout.write(self.style.SUCCESS('LSH-индекс пересобран'))
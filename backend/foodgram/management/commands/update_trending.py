@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from foodgram.trending import update_trending
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать популярные рецепты по счетчикам добавлений в '
+            'избранное и в список покупок. Запускать периодически, '
+            'например раз в 10 минут.')
+
+    def handle(self, *args, **options):
+        size = update_trending()
+        self.stdout.write(
+            self.style.SUCCESS(f'Популярных рецептов: {size}'))
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.19 on 2026-10-19 08:54
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_tags_mask(apps, schema_editor):
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    Tag = apps.get_model('foodgram', 'Tag')
+    # Тэгам с id больше 63 бит не помещается в BigInteger, биты тэгов
+    # пересчитывает 0014_tag_bit.
+    for tag_id in Tag.objects.filter(pk__lte=63).values_list('pk', flat=True):
+        Recipe.objects.filter(tags=tag_id).update(
+            tags_mask=F('tags_mask').bitor(1 << (tag_id - 1))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0002_auto_20221002_1316'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тэгов'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
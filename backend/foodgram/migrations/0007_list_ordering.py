@@ -0,0 +1,21 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:18
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0006_feed_timeline'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredientinrecipe',
+            options={'ordering': ('id',), 'verbose_name': 'Количество ингредиента в рецепте', 'verbose_name_plural': 'Количество ингредиента в рецепте'},
+        ),
+        migrations.AlterModelOptions(
+            name='tag',
+            options={'ordering': ('id',), 'verbose_name': 'Тэг', 'verbose_name_plural': 'Тэги'},
+        ),
+    ]
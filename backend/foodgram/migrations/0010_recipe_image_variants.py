@@ -0,0 +1,25 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:36
+
+from django.db import migrations, models
+
+
+def drop_documents(apps, schema_editor):
+    # Документы без копий изображения пересоберутся при чтении.
+    RecipeDocument = apps.get_model('foodgram', 'RecipeDocument')
+    RecipeDocument.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0009_recipe_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Копии изображения'),
+        ),
+        migrations.RunPython(drop_documents, migrations.RunPython.noop),
+    ]
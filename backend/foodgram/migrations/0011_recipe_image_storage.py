@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:39
+
+from django.db import migrations, models
+import foodgram.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0010_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=foodgram.storage.ContentAddressedStorage(), upload_to='foodgram/media/', verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0012_recipe_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.PositiveIntegerField(verbose_name='Id пользователя')),
+                ('email', models.EmailField(max_length=254, verbose_name='Почта пользователя')),
+                ('status', models.CharField(choices=[('running', 'Выполняется'), ('done', 'Завершено'), ('failed', 'Ошибка')], default='running', max_length=16, verbose_name='Состояние')),
+                ('recipes_total', models.PositiveIntegerField(default=0, verbose_name='Рецептов всего')),
+                ('recipes_deleted', models.PositiveIntegerField(default=0, verbose_name='Рецептов удалено')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата запуска')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+            ],
+            options={
+                'verbose_name': 'Удаление пользователя',
+                'verbose_name_plural': 'Удаления пользователей',
+                'ordering': ('-created',),
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:06
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import F
+
+TAG_MASK_BITS = 63
+
+
+def fill_tag_bits(apps, schema_editor):
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    Tag = apps.get_model('foodgram', 'Tag')
+    Recipe.objects.update(tags_mask=0)
+    tag_ids = Tag.objects.order_by('pk').values_list('pk', flat=True)
+    for bit, tag_id in enumerate(tag_ids[:TAG_MASK_BITS]):
+        Tag.objects.filter(pk=tag_id).update(bit=bit)
+        Recipe.objects.filter(tags=tag_id).update(
+            tags_mask=F('tags_mask').bitor(1 << bit)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0013_deletion_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, unique=True, validators=[django.core.validators.MaxValueValidator(62, 'Бит не может быть больше 62')], verbose_name='Бит в маске тэгов'),
+        ),
+        migrations.RunPython(fill_tag_bits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+from foodgram.similarity import band_buckets, signatures
+
+BATCH_SIZE = 5000
+
+
+def fill_signatures(apps, schema_editor):
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    IngredientInRecipe = apps.get_model('foodgram', 'IngredientInRecipe')
+    RecipeSignature = apps.get_model('foodgram', 'RecipeSignature')
+    RecipeBand = apps.get_model('foodgram', 'RecipeBand')
+    recipes = Recipe.objects.filter(signature__isnull=True).order_by('pk')
+    last_pk = 0
+    while True:
+        recipe_ids = list(recipes.filter(pk__gt=last_pk).values_list(
+            'pk', flat=True)[:BATCH_SIZE])
+        if not recipe_ids:
+            return
+        ingredient_sets = defaultdict(set)
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredient_sets[recipe_id].add(ingredient_id)
+        rows = signatures([ingredient_sets[pk] for pk in recipe_ids])
+        RecipeSignature.objects.bulk_create(
+            RecipeSignature(recipe_id=pk, minhash=row.tobytes())
+            for pk, row in zip(recipe_ids, rows)
+        )
+        RecipeBand.objects.bulk_create(
+            RecipeBand(recipe_id=pk, band=band, bucket=int(bucket))
+            for pk, recipe_buckets in zip(recipe_ids, band_buckets(rows))
+            for band, bucket in enumerate(recipe_buckets)
+        )
+        last_pk = recipe_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0014_tag_bit'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_signatures, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,19 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
+# Битов в маске тэгов: старший бит BigInteger делает маску отрицательной.
+TAG_MASK_BITS = 63
+# Попыток выбрать бит, если его одновременно занял другой тэг.
+BIT_ALLOCATION_ATTEMPTS = 5
+
 
 class Tag(models.Model):
 
@@ -22,13 +31,62 @@ class Tag(models.Model):
         'Слаг', unique=True, max_length=254
     )
 
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске тэгов',
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        validators=[MaxValueValidator(
+            TAG_MASK_BITS - 1,
+            f'Бит не может быть больше {TAG_MASK_BITS - 1}')],
+    )
+
     class Meta:
+        ordering = ('id',)
         verbose_name = 'Тэг'
         verbose_name_plural = 'Тэги'
 
     def __str__(self):
         return self.name
 
+    def allocate_bit(self):
+        """Выбрать младший свободный бит маски.
+
+        Если свободных битов нет, тэг остается без бита, и рецепты с ним
+        фильтруются через таблицу связей.
+        """
+        used = set(
+            Tag.objects.exclude(pk=self.pk).exclude(bit=None)
+            .values_list('bit', flat=True))
+        self.bit = next(
+            (bit for bit in range(TAG_MASK_BITS) if bit not in used), None)
+
+    def clean(self):
+        if self.bit is not None and self.bit >= TAG_MASK_BITS:
+            raise ValidationError(
+                {'bit': f'Бит не может быть больше {TAG_MASK_BITS - 1}'})
+
+    def save(self, *args, **kwargs):
+        """Сохранить тэг, выделив ему бит, если его еще нет.
+
+        Одновременно создаваемые тэги могут выбрать один и тот же бит;
+        проигравший получает ошибку уникальности и выбирает бит заново.
+        """
+        if self.bit is not None:
+            return super().save(*args, **kwargs)
+        for _ in range(BIT_ALLOCATION_ATTEMPTS):
+            self.allocate_bit()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if self.bit is None or not Tag.objects.filter(
+                        bit=self.bit).exclude(pk=self.pk).exists():
+                    raise
+        self.bit = None
+        return super().save(*args, **kwargs)
+
 
 class Ingredient(models.Model):
 
@@ -66,6 +124,11 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Изображение',
         upload_to='foodgram/media/',
+        storage=ContentAddressedStorage(),
+    )
+
+    image_variants = models.JSONField(
+        'Копии изображения', default=dict, editable=False
     )
 
     text = models.TextField('Описание', max_length=2000)
@@ -82,6 +145,10 @@ class Recipe(models.Model):
         verbose_name='Теги'
     )
 
+    tags_mask = models.BigIntegerField(
+        'Маска тэгов', default=0, editable=False
+    )
+
     cooking_time = models.PositiveSmallIntegerField(
         'Время приготовления',
         validators=[
@@ -91,13 +158,23 @@ class Recipe(models.Model):
     )
 
     pub_date = models.DateTimeField(
-        'Дата публикации', auto_now_add=True
+        'Дата публикации', auto_now_add=True, db_index=True
+    )
+
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    search_vector = SearchVectorField(
+        'Поисковый вектор', null=True, editable=False
     )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=('updated_at', 'id'), name='recipe_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -147,6 +224,7 @@ class IngredientInRecipe(models.Model):
     )
 
     class Meta:
+        ordering = ('id',)
         verbose_name = 'Количество ингредиента в рецепте'
         verbose_name_plural = verbose_name
         constraints = [
@@ -209,3 +287,200 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Рецепт {self.recipe} в корзине у пользователя {self.user}'
+
+
+class RecipeSignature(models.Model):
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Рецепт'
+    )
+    minhash = models.BinaryField('MinHash-сигнатура')
+
+    class Meta:
+        verbose_name = 'Сигнатура рецепта'
+        verbose_name_plural = 'Сигнатуры рецептов'
+
+    def __str__(self):
+        return f'Сигнатура рецепта {self.recipe_id}'
+
+
+class RecipeBand(models.Model):
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='bands',
+        verbose_name='Рецепт'
+    )
+    band = models.PositiveSmallIntegerField('Номер полосы')
+    bucket = models.BigIntegerField('Хеш полосы')
+
+    class Meta:
+        verbose_name = 'Полоса LSH-индекса'
+        verbose_name_plural = 'Полосы LSH-индекса'
+        indexes = [
+            models.Index(fields=('band', 'bucket'), name='band_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f'Полоса {self.band} рецепта {self.recipe_id}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'Рецепт {self.recipe_id} в ленте {self.user_id}'
+
+
+class FeedPullAuthor(models.Model):
+    author = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='feed_pull',
+        verbose_name='Автор'
+    )
+    created = models.DateTimeField('Дата отметки', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Автор без рассылки в ленты'
+        verbose_name_plural = 'Авторы без рассылки в ленты'
+
+    def __str__(self):
+        return f'{self.author} читается из ленты при запросе'
+
+
+class RecipeDocument(models.Model):
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт'
+    )
+    document = models.BinaryField('Фрагменты JSON')
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        return f'Документ рецепта {self.recipe_id}'
+
+
+class RecipeTombstone(models.Model):
+    recipe_id = models.PositiveIntegerField('Id рецепта')
+    deleted_at = models.DateTimeField('Дата удаления', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Удаленный рецепт'
+        verbose_name_plural = 'Удаленные рецепты'
+        indexes = [
+            models.Index(
+                fields=('deleted_at', 'id'), name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'Рецепт {self.recipe_id} удален'
+
+
+class RecipeActivity(models.Model):
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Рецепт'
+    )
+    bucket = models.DateTimeField('Начало часа')
+    favorites = models.IntegerField('Добавления в избранное', default=0)
+    carts = models.IntegerField('Добавления в покупки', default=0)
+
+    class Meta:
+        verbose_name = 'Активность по рецепту'
+        verbose_name_plural = 'Активность по рецептам'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('bucket', 'recipe'),
+                name='unique_recipe_activity'
+            )
+        ]
+
+    def __str__(self):
+        return f'Активность рецепта {self.recipe_id} за {self.bucket}'
+
+
+class TrendingRecipe(models.Model):
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт'
+    )
+    rank = models.PositiveIntegerField('Место', unique=True)
+    score = models.FloatField('Популярность')
+
+    class Meta:
+        ordering = ('rank',)
+        verbose_name = 'Популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+
+    def __str__(self):
+        return f'Рецепт {self.recipe_id} на {self.rank} месте'
+
+
+class DeletionJob(models.Model):
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Завершено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user_id = models.PositiveIntegerField('Id пользователя')
+    email = models.EmailField('Почта пользователя')
+    status = models.CharField(
+        'Состояние', max_length=16, choices=STATUSES, default=RUNNING)
+    recipes_total = models.PositiveIntegerField('Рецептов всего', default=0)
+    recipes_deleted = models.PositiveIntegerField(
+        'Рецептов удалено', default=0)
+    created = models.DateTimeField('Дата запуска', auto_now_add=True)
+    finished = models.DateTimeField('Дата завершения', null=True, blank=True)
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Удаление пользователя'
+        verbose_name_plural = 'Удаления пользователей'
+
+    def __str__(self):
+        return f'Удаление {self.email}'
@@ -0,0 +1,107 @@
+"""Выполнение синхронной работы из асинхронных представлений.
+
+ORM и DRF синхронны, поэтому асинхронные представления отдают их работу
+в ограниченный пул потоков (``ASYNC_ORM_THREADS``), а тяжелую для
+процессора генерацию pdf - в пул процессов (``ASYNC_PDF_PROCESSES``).
+Копии изображений рецептов строятся в своем пуле процессов
+(``ASYNC_IMAGE_PROCESSES``) в любом режиме.
+Так медленный запрос занимает поток пула, а не весь воркер.
+"""
+import asyncio
+import contextvars
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.permissions import SAFE_METHODS
+
+_lock = threading.Lock()
+_executors = {}
+
+PROCESS_POOLS = {
+    'pdf': 'PDF_PROCESSES',
+    'images': 'IMAGE_PROCESSES',
+}
+
+
+def async_setting(name, default):
+    return getattr(settings, f'ASYNC_{name}', default)
+
+
+def create_executor(kind):
+    if kind == 'orm':
+        return ThreadPoolExecutor(
+            max_workers=async_setting('ORM_THREADS', 16),
+            thread_name_prefix='orm'
+        )
+    # Воркеры запускаются через spawn: fork многопоточного процесса
+    # сервера может унаследовать захваченные блокировки.
+    return ProcessPoolExecutor(
+        max_workers=async_setting(PROCESS_POOLS[kind], 2),
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+
+def get_executor(kind):
+    with _lock:
+        if kind not in _executors:
+            _executors[kind] = create_executor(kind)
+    return _executors[kind]
+
+
+def call_with_connections(func, args, kwargs):
+    """Вызвать функцию, закрыв устаревшие соединения с базой до и после.
+
+    Потоки пула не получают сигналов начала и конца запроса, поэтому
+    соединения закрываются здесь.
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """Выполнить синхронную функцию в пуле потоков для ORM."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor('orm'), context.run,
+        call_with_connections, func, args, kwargs
+    )
+
+
+async def run_in_process(func, *args):
+    """Выполнить функцию в пуле процессов. Аргументы должны сериализоваться.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor('pdf'), func, *args)
+
+
+def render_response(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response.render()
+    return response
+
+
+def read_async(view):
+    """Асинхронная обертка синхронного представления.
+
+    Безопасные запросы выполняются и рендерятся в пуле потоков для ORM,
+    остальные - как обычные синхронные представления под ASGI.
+    """
+    write_view = sync_to_async(view)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await run_in_thread(
+                render_response, view, request, *args, **kwargs)
+        return await write_view(request, *args, **kwargs)
+
+    return wrapper
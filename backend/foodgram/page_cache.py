@@ -0,0 +1,53 @@
+"""Кеш ответов со списком и страницами рецептов для анонимов.
+
+Анонимам рецепты отдаются одинаково, поэтому данные ответа кешируются
+по адресу запроса и набору параметров без учета их порядка на
+``RECIPE_PAGE_CACHE_TIMEOUT`` секунд (0 - кеш выключен). Любое изменение
+рецептов, их документов, тэгов и популярных рецептов увеличивает версию
+рецептов (см. ``cache``), и записи прежней версии перестают быть
+свежими.
+
+Устаревшую запись пересчитывает один запрос, остальные еще до
+``RECIPE_PAGE_CACHE_STALE_SECONDS`` секунд получают прежний ответ. Если
+прежнего ответа нет, запросы считают ответ сами, не ожидая друг друга.
+"""
+import hashlib
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from .cache import get_or_revalidate, query_signature
+
+
+def page_cache_setting(name, default):
+    return getattr(settings, f'RECIPE_PAGE_CACHE_{name}', default)
+
+
+def page_key(request):
+    url = request.build_absolute_uri(request.path)
+    signature = query_signature(request.query_params)
+    return 'recipe-page:' + hashlib.sha256(
+        f'{url}?{signature}'.encode()).hexdigest()
+
+
+def cached_page(request, build):
+    """Ответ ``build()``, для анонимного запроса - из кеша.
+
+    ``build`` возвращает ``Response``; кешируются его данные и статус,
+    из которых собирается новый ``Response``.
+    """
+    timeout = page_cache_setting('TIMEOUT', 60)
+    if (not timeout or request.method != 'GET'
+            or request.user.is_authenticated):
+        return build()
+
+    def compute():
+        response = build()
+        return response.data, response.status_code
+
+    data, status = get_or_revalidate(
+        page_key(request), compute, timeout,
+        page_cache_setting('STALE_SECONDS', 30),
+        page_cache_setting('LOCK_SECONDS', 10),
+    )
+    return Response(data, status=status)
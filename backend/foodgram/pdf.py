@@ -0,0 +1,40 @@
+"""Отрисовка списка покупок в pdf.
+
+Модуль не зависит от Django, чтобы функцию отрисовки можно было
+выполнять в отдельном процессе.
+"""
+import io
+
+from reportlab.lib import colors
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+
+def render_shopping_list_pdf(shopping_list):
+    """Создать pdf файл и вернуть его содержимое."""
+    buffer = io.BytesIO()
+    pdfmetrics.registerFont(TTFont('Neocyr', 'Neocyr.ttf', 'UTF-8'))
+    pdf = canvas.Canvas(buffer)
+    pdf.setFont('Neocyr', 24)
+    pdf.setFillColor(colors.black)
+    pdf.drawCentredString(300, 770, 'Список покупок')
+    pdf.setFillColor(colors.black)
+    pdf.setFont('Neocyr', 16)
+    height = 700
+    num = 1
+    for name, data in shopping_list.items():
+        pdf.drawString(
+            60,
+            height,
+            f"{num}. {name} - {data['amount']} {data['measurement_unit']}"
+        )
+        num += 1
+        height -= 25
+        if height == 50:
+            pdf.showPage()
+            pdf.setFont('Neocyr', 16)
+            height = 700
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
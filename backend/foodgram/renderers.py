@@ -0,0 +1,63 @@
+import json
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+UNICODE_LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class RawJSON:
+    """Готовый JSON, который вставляется в ответ без перекодирования."""
+
+    __slots__ = ('contents',)
+
+    def __init__(self, contents):
+        self.contents = contents
+
+
+class RawJSONEncoder(JSONEncoder):
+
+    def default(self, obj):
+        if isinstance(obj, RawJSON):
+            return json.loads(obj.contents)
+        return super().default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON-рендерер на orjson с тем же выводом, что у ``JSONRenderer``.
+
+    Даты и прочие типы, которые orjson кодирует по-своему, передаются
+    в кодировщик DRF. Отступы, ASCII-вывод и данные, которые orjson не
+    умеет кодировать, обрабатывает стандартный рендерер.
+    """
+
+    encoder_class = RawJSONEncoder
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def default(self, obj):
+        if isinstance(obj, RawJSON):
+            return orjson.Fragment(obj.contents)
+        return self.encoder_class().default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (indent is not None or self.ensure_ascii
+                or not api_settings.COMPACT_JSON):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.default,
+                option=self.options
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        for char, escaped in UNICODE_LINE_SEPARATORS:
+            ret = ret.replace(char, escaped)
+        return ret
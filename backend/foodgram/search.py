@@ -0,0 +1,86 @@
+"""Полнотекстовый поиск рецептов по названию и описанию.
+
+В PostgreSQL поиск идет по колонке ``Recipe.search_vector`` (tsvector
+с русской конфигурацией и GIN-индексом), в SQLite - по виртуальной
+таблице FTS5, чтобы поиск можно было проверить без PostgreSQL.
+"""
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'foodgram_recipe_fts'
+
+
+def recipe_search_vector():
+    """Выражение для вектора: название весомее описания."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def fts_match_query(query):
+    """Преобразовать строку поиска в запрос FTS5 по префиксам слов."""
+    terms = (term.replace('"', '""') for term in query.split())
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def update_search_index(recipe):
+    """Обновить поисковый индекс рецепта после сохранения."""
+    connection = connections[recipe._state.db]
+    if connection.vendor == 'postgresql':
+        type(recipe).objects.using(recipe._state.db).filter(
+            pk=recipe.pk).update(search_vector=recipe_search_vector())
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, text) '
+                'VALUES (%s, %s, %s)',
+                [recipe.pk, recipe.name, recipe.text]
+            )
+
+
+def remove_from_search_index(recipe):
+    """Удалить рецепт из поискового индекса SQLite."""
+    remove_recipes_from_search_index([recipe.pk], recipe._state.db)
+
+
+def remove_recipes_from_search_index(recipe_ids, using):
+    """Удалить рецепты из поискового индекса SQLite одним запросом."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and recipe_ids:
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                list(recipe_ids)
+            )
+
+
+def search_recipes(queryset, query):
+    """Отфильтровать queryset по строке поиска и упорядочить по рангу."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).filter(search_vector=search_query).order_by(
+            '-search_rank', '-pub_date')
+    if vendor == 'sqlite':
+        match = fts_match_query(query)
+        if not match:
+            return queryset
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            where=[f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+                   f'WHERE {FTS_TABLE} MATCH %s)'],
+            params=[match]
+        ).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 2.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            [match]
+        )).order_by('-search_rank', '-pub_date')
+    return queryset.filter(name__icontains=query)
@@ -1,10 +1,70 @@
+from django.db import transaction
+from django.db.models import Count, Window
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 from users.serializers import CustomUserSerializer
 
+from .events import publish_recipe
+from .facets import FACETS
+from .fast_list import RECIPE_FIELDS
+from .image_urls import image_storage, variant_urls
 from .models import (Favorite, Follow, Ingredient, IngredientInRecipe, Recipe,
                      ShoppingCart, Tag)
+from .tag_mask import tags_mask
+from .updates import refresh_recipe
+
+MAX_SEARCH_INGREDIENTS = 100
+MAX_BATCH_RECIPES = 100
+
+
+class ImageVariantsField(serializers.Field):
+    """Адреса уменьшенных копий изображения рецепта."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', '*')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return variant_urls(
+            recipe.image.name, recipe.image_variants,
+            self.context.get('request'))
+
+
+class RecipeImageField(Base64ImageField):
+    """Изображение в base64 или имя файла, загруженного отдельно.
+
+    Имя возвращает ``POST /api/recipes/images/``.
+    """
+
+    def to_internal_value(self, data):
+        storage = image_storage()
+        directory = Recipe._meta.get_field('image').upload_to
+        if (isinstance(data, str)
+                and storage.is_content_name(data, directory)):
+            # Недавно измененный файл не удаляется, пока рецепт с ним
+            # сохраняется.
+            if not storage.touch(data):
+                raise serializers.ValidationError(
+                    'Файл не найден, загрузите изображение заново')
+            return data
+        return super().to_internal_value(data)
+
+
+class ImageUploadSerializer(serializers.Serializer):
+    """Сериализатор потоковой загрузки изображения рецепта."""
+
+    image = serializers.ImageField()
+
+    def create(self, validated_data):
+        """Сохранить файл и вернуть его имя в хранилище."""
+        image = validated_data['image']
+        return image_storage().save(
+            Recipe._meta.get_field('image').generate_filename(
+                None, image.name),
+            image
+        )
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -34,6 +94,107 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         )
 
 
+class IngredientSearchSerializer(serializers.Serializer):
+    """Сериализатор параметров поиска рецептов по ингредиентам."""
+
+    ingredients = serializers.CharField()
+
+    def validate_ingredients(self, value):
+        """Разобрать список id ингредиентов через запятую."""
+        try:
+            ingredient_ids = {int(item) for item in value.split(',') if item}
+        except ValueError:
+            raise serializers.ValidationError(
+                'Укажите id ингредиентов через запятую')
+        if not ingredient_ids:
+            raise serializers.ValidationError(
+                'Укажите хотя бы один ингредиент')
+        if len(ingredient_ids) > MAX_SEARCH_INGREDIENTS:
+            raise serializers.ValidationError(
+                'Можно указать не больше '
+                f'{MAX_SEARCH_INGREDIENTS} ингредиентов')
+        return ingredient_ids
+
+
+class RecipeFieldsSerializer(serializers.Serializer):
+    """Сериализатор параметров выбора полей рецептов."""
+
+    fields = serializers.CharField(required=False)
+    compact = serializers.BooleanField(default=False)
+
+    def validate_fields(self, value):
+        """Разобрать список полей через запятую в порядке вывода."""
+        fields = {item.strip() for item in value.split(',') if item.strip()}
+        if not fields:
+            raise serializers.ValidationError('Укажите хотя бы одно поле')
+        unknown = fields - set(RECIPE_FIELDS)
+        if unknown:
+            raise serializers.ValidationError(
+                f'Неизвестные поля: {", ".join(sorted(unknown))}')
+        return [field for field in RECIPE_FIELDS if field in fields]
+
+
+class RecipeFacetsSerializer(serializers.Serializer):
+    """Сериализатор списка счетчиков к списку рецептов."""
+
+    facets = serializers.CharField()
+
+    def validate_facets(self, value):
+        """Разобрать список счетчиков через запятую."""
+        facets = {item.strip() for item in value.split(',') if item.strip()}
+        unknown = facets - set(FACETS)
+        if unknown or not facets:
+            raise serializers.ValidationError(
+                f'Доступные счетчики: {", ".join(FACETS)}')
+        return [facet for facet in FACETS if facet in facets]
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов с версиями для пакетного чтения."""
+
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        """Разобрать ``id[:версия]`` через запятую, сохранив порядок.
+
+        Возвращает словарь id -> версия (``None``, если не указана).
+        """
+        versions = {}
+        for item in value.split(','):
+            if not item:
+                continue
+            recipe_id, _, version = item.partition(':')
+            try:
+                recipe_id = int(recipe_id)
+            except ValueError:
+                raise serializers.ValidationError(
+                    'Укажите id рецептов через запятую')
+            if recipe_id < 1:
+                raise serializers.ValidationError(
+                    'Укажите id рецептов через запятую')
+            versions.setdefault(recipe_id, version or None)
+        if not versions:
+            raise serializers.ValidationError('Укажите хотя бы один рецепт')
+        if len(versions) > MAX_BATCH_RECIPES:
+            raise serializers.ValidationError(
+                f'Можно указать не больше {MAX_BATCH_RECIPES} рецептов')
+        return versions
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для пакетных операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_RECIPES,
+    )
+
+    def validate_ids(self, data):
+        """Убрать повторы, сохранив порядок."""
+        return list(dict.fromkeys(data))
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор тэгов."""
 
@@ -50,6 +211,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeSerializer(
         many=True, source='ingredientinrecipe_set')
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -71,15 +233,16 @@ class RecipeListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = (
-            'id', 'author', 'name', 'image', 'text', 'ingredients',
-            'tags', 'cooking_time', 'is_favorited', 'is_in_shopping_cart')
+            'id', 'author', 'name', 'image', 'image_variants', 'text',
+            'ingredients', 'tags', 'cooking_time', 'is_favorited',
+            'is_in_shopping_cart')
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания рецептов."""
 
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
     ingredients = IngredientInRecipeSerializer(
         many=True, source='ingredientinrecipe_set')
     tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
@@ -146,31 +309,54 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 amount=ingredient.get('amount'),
             )
 
+    @transaction.atomic
     def create(self, validated_data):
         """Метод создает рецепт."""
         image = validated_data.pop('image')
         tags_data = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredientinrecipe_set')
-        recipe = Recipe.objects.create(image=image, **validated_data)
+        recipe = Recipe.objects.create(
+            image=image, tags_mask=tags_mask(tags_data), **validated_data)
         self.add_recipe_ingredient(ingredients, recipe)
         recipe.tags.set(tags_data)
+        refresh_recipe(
+            recipe, ingredient_ids=[item.get('id') for item in ingredients])
+        publish_recipe(recipe)
         return recipe
 
+    @staticmethod
+    def is_current_image(instance, image):
+        """Совпадает ли присланное изображение с текущим изображением
+        рецепта: имя загруженного файла сравнивается с именем, данные из
+        base64 - по хэшу содержимого."""
+        if isinstance(image, str):
+            return image == instance.image.name
+        return instance.image.storage.has_content(instance.image.name, image)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Метод изменяет рецепт."""
-        instance.image = validated_data.get('image', instance.image)
+        image = validated_data.get('image')
+        if image is not None and not self.is_current_image(instance, image):
+            instance.image = image
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time
         )
-        instance.tags.clear()
-        tags = self.initial_data.get('tags')
+        tags = validated_data.get('tags')
         instance.tags.set(tags)
-        IngredientInRecipe.objects.filter(recipe=instance).all().delete()
+        instance.tags_mask = tags_mask(tags)
+        recipe_ingredients = IngredientInRecipe.objects.filter(
+            recipe=instance)
+        old_ids = list(
+            recipe_ingredients.values_list('ingredient_id', flat=True))
+        recipe_ingredients.delete()
         ingredients = validated_data.get('ingredientinrecipe_set')
         self.add_recipe_ingredient(ingredients, instance)
         instance.save()
+        refresh_recipe(
+            instance, old_ids, [item.get('id') for item in ingredients])
         return instance
 
     def get_is_favorited(self, obj):
@@ -198,6 +384,7 @@ class RecipeForFollowSerializer(serializers.ModelSerializer):
     """Вспомогательный сериализатор для получения рецепта в подписках."""
 
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -205,6 +392,7 @@ class RecipeForFollowSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
         read_only_fields = (
@@ -272,6 +460,37 @@ class FollowSerializer(serializers.ModelSerializer):
         return Recipe.objects.filter(author=obj.author).count()
 
 
+def subscription_data(author, request):
+    """Данные новой подписки на ``author`` в формате ``FollowSerializer``.
+
+    Подписка только что создана, поэтому ``is_subscribed`` известен заранее,
+    а рецепты автора и их общее число читаются одним запросом: число
+    считается оконной функцией до применения ``recipes_limit``.
+    """
+    recipes_limit = request.query_params.get('recipes_limit')
+    queryset = Recipe.objects.filter(author=author).annotate(
+        total=Window(Count('pk')))
+    if recipes_limit is not None:
+        queryset = queryset[:int(recipes_limit)]
+    recipes = list(queryset)
+    if recipes:
+        recipes_count = recipes[0].total
+    elif recipes_limit is None:
+        recipes_count = 0
+    else:
+        recipes_count = Recipe.objects.filter(author=author).count()
+    return {
+        'email': author.email,
+        'id': author.id,
+        'username': author.username,
+        'first_name': author.first_name,
+        'last_name': author.last_name,
+        'is_subscribed': True,
+        'recipes': RecipeForFollowSerializer(recipes, many=True).data,
+        'recipes_count': recipes_count,
+    }
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор для избранного."""
 
@@ -280,13 +499,14 @@ class FavoriteSerializer(serializers.ModelSerializer):
     )
     name = serializers.CharField(source='recipe.name', read_only=True)
     image = Base64ImageField(source='recipe.image', read_only=True)
+    image_variants = ImageVariantsField(source='recipe')
     cooking_time = serializers.IntegerField(
         source='recipe.cooking_time', read_only=True
     )
 
     class Meta:
         model = Favorite
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
@@ -297,10 +517,11 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     )
     name = serializers.CharField(source='recipe.name', read_only=True)
     image = Base64ImageField(source='recipe.image', read_only=True)
+    image_variants = ImageVariantsField(source='recipe')
     cooking_time = serializers.IntegerField(
         source='recipe.cooking_time', read_only=True
     )
 
     class Meta:
         model = ShoppingCart
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
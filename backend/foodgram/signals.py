@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_recipes
+from .documents import invalidate_documents
+from .images import schedule_variants
+from .ingredient_index import ingredient_index
+from .models import Ingredient, Recipe, RecipeTombstone, Tag
+from .search import remove_from_search_index, update_search_index
+from .tag_mask import clear_tag_bit, invalidate_tag_bits, set_tag_bit
+
+User = get_user_model()
+
+DOCUMENT_IGNORED_USER_FIELDS = frozenset(('last_login',))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def reset_tag_bits(sender, **kwargs):
+    """Сбросить кеш слагов тэгов."""
+    invalidate_tag_bits()
+
+
+@receiver(post_save, sender=Tag)
+def mark_tag_recipes(sender, instance, **kwargs):
+    """Добавить бит тэга в маски рецептов, если тэг получил бит."""
+    set_tag_bit(instance)
+
+
+@receiver(pre_delete, sender=Tag)
+def unmark_tag_recipes(sender, instance, **kwargs):
+    """Освободить бит удаляемого тэга в масках рецептов."""
+    clear_tag_bit(instance)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_recipe_cache(sender, **kwargs):
+    """Сбросить закешированные выборки по рецептам."""
+    invalidate_recipes()
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    """Обновить поисковый индекс рецепта."""
+    update_search_index(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_variants(sender, instance, **kwargs):
+    """Построить копии нового изображения рецепта в фоне."""
+    schedule_variants(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    """Убрать рецепт из поискового индекса."""
+    remove_from_search_index(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def bury_recipe(sender, instance, **kwargs):
+    """Оставить отметку об удалении рецепта для синхронизации."""
+    RecipeTombstone.objects.create(recipe_id=instance.pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def drop_recipe_ingredients(sender, instance, **kwargs):
+    """Убрать рецепт из индекса ингредиентов."""
+    if not ingredient_index.is_built():
+        return
+    ingredient_index.update_recipe(
+        instance.pk,
+        instance.ingredientinrecipe_set.values_list(
+            'ingredient_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=User)
+def refresh_author_documents(sender, instance, created, update_fields,
+                             **kwargs):
+    """Пересобрать документы рецептов после изменения профиля автора."""
+    if created:
+        return
+    if (update_fields
+            and DOCUMENT_IGNORED_USER_FIELDS.issuperset(update_fields)):
+        return
+    invalidate_documents(Recipe.objects.filter(author=instance))
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def refresh_ingredient_documents(sender, instance, created=False, **kwargs):
+    """Пересобрать документы рецептов с измененным ингредиентом."""
+    if created:
+        return
+    invalidate_documents(
+        Recipe.objects.filter(ingredientinrecipe__ingredient=instance))
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def refresh_tag_documents(sender, instance, created=False, **kwargs):
+    """Пересобрать документы рецептов с измененным тэгом."""
+    if created:
+        return
+    invalidate_documents(Recipe.objects.filter(tags=instance))
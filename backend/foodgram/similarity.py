@@ -0,0 +1,134 @@
+"""Поиск похожих рецептов по наборам ингредиентов.
+
+Для каждого рецепта считается MinHash-сигнатура множества id его
+ингредиентов. Сигнатура режется на полосы, хеши полос хранятся в
+``RecipeBand`` и служат LSH-индексом: кандидатами считаются рецепты,
+совпавшие с исходным хотя бы в одной полосе. Кандидаты затем
+упорядочиваются по точному коэффициенту Жаккара.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import IngredientInRecipe, RecipeBand, RecipeSignature
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+PRIME = (1 << 31) - 1
+MAX_CANDIDATES = 500
+
+_random = np.random.RandomState(20221002)
+_A = _random.randint(1, PRIME, size=NUM_PERM).astype(np.uint64)
+_B = _random.randint(0, PRIME, size=NUM_PERM).astype(np.uint64)
+with np.errstate(over='ignore'):
+    _BAND_WEIGHTS = (
+        np.uint64(0x9E3779B97F4A7C15) ** np.arange(ROWS, dtype=np.uint64)
+    )
+
+
+def signatures(ingredient_sets):
+    """Посчитать MinHash-сигнатуры для списка множеств id ингредиентов.
+
+    Возвращает массив формы (len(ingredient_sets), NUM_PERM). Пустому
+    множеству соответствует сигнатура из значений PRIME.
+    """
+    result = np.full((len(ingredient_sets), NUM_PERM), PRIME, np.uint32)
+    sizes = np.fromiter(
+        (len(ids) for ids in ingredient_sets), np.int64,
+        count=len(ingredient_sets)
+    )
+    filled = np.flatnonzero(sizes)
+    if not len(filled):
+        return result
+    values = np.fromiter(
+        (ingredient_id for index in filled
+         for ingredient_id in ingredient_sets[index]),
+        np.uint64
+    )
+    hashes = (_A[:, None] * values[None, :] + _B[:, None]) % PRIME
+    offsets = np.concatenate(([0], np.cumsum(sizes[filled])[:-1]))
+    result[filled] = np.minimum.reduceat(hashes, offsets, axis=1).T
+    return result
+
+
+def band_buckets(signature_rows):
+    """Посчитать хеши полос для массива сигнатур.
+
+    Возвращает массив формы (число сигнатур, BANDS) из неотрицательных
+    int64, пригодных для ``BigIntegerField``.
+    """
+    with np.errstate(over='ignore'):
+        bands = signature_rows.astype(np.uint64).reshape(
+            len(signature_rows), BANDS, ROWS)
+        mixed = (bands * _BAND_WEIGHTS).sum(axis=2, dtype=np.uint64)
+    return (mixed >> np.uint64(1)).astype(np.int64)
+
+
+def jaccard(first, second):
+    if not first and not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def recipe_ingredient_sets(recipe_ids):
+    """Получить множества id ингредиентов рецептов одним запросом."""
+    ingredient_sets = defaultdict(set)
+    for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id'):
+        ingredient_sets[recipe_id].add(ingredient_id)
+    return ingredient_sets
+
+
+def save_signatures(recipe_ids, ingredient_sets):
+    """Пересчитать и сохранить сигнатуры и полосы для пачки рецептов."""
+    rows = signatures([ingredient_sets.get(pk, ()) for pk in recipe_ids])
+    buckets = band_buckets(rows)
+    with transaction.atomic():
+        RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeBand.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSignature.objects.bulk_create(
+            RecipeSignature(recipe_id=pk, minhash=row.tobytes())
+            for pk, row in zip(recipe_ids, rows)
+        )
+        RecipeBand.objects.bulk_create(
+            RecipeBand(recipe_id=pk, band=band, bucket=int(bucket))
+            for pk, recipe_buckets in zip(recipe_ids, buckets)
+            for band, bucket in enumerate(recipe_buckets)
+        )
+
+
+def update_recipe_signature(recipe_id, ingredient_ids):
+    """Пересчитать сигнатуру рецепта после записи его ингредиентов."""
+    save_signatures([recipe_id], {recipe_id: set(ingredient_ids)})
+
+
+def find_similar(recipe_id, limit):
+    """Найти похожие рецепты.
+
+    Возвращает список пар (id рецепта, коэффициент Жаккара) по убыванию
+    сходства.
+    """
+    ingredient_sets = recipe_ingredient_sets([recipe_id])
+    own = ingredient_sets.get(recipe_id, set())
+    if not own:
+        return []
+    buckets = band_buckets(signatures([own]))[0]
+    condition = Q()
+    for band, bucket in enumerate(buckets):
+        condition |= Q(band=band, bucket=int(bucket))
+    candidates = list(RecipeBand.objects.filter(condition).exclude(
+        recipe_id=recipe_id
+    ).values('recipe_id').annotate(
+        matched_bands=Count('pk')
+    ).order_by('-matched_bands').values_list(
+        'recipe_id', flat=True)[:MAX_CANDIDATES])
+    candidate_sets = recipe_ingredient_sets(candidates)
+    scored = sorted(
+        ((pk, jaccard(own, candidate_sets[pk])) for pk in candidates),
+        key=lambda item: (-item[1], -item[0])
+    )
+    return scored[:limit]
@@ -0,0 +1,82 @@
+"""Хранилище файлов с именами по содержимому.
+
+Имя файла - sha256 содержимого с исходным расширением в подкаталоге
+из первых двух символов хэша. Повторная загрузка тех же байтов не
+пишет файл заново, а возвращает имя уже сохраненного. Один файл может
+принадлежать нескольким рецептам, поэтому удалять его можно, только
+если на него больше никто не ссылается.
+
+Файл, имя которого только что выдано повторно, еще может быть не
+привязан к рецепту. Поэтому ``save`` обновляет время изменения такого
+файла, а удаление пропускает недавно измененные файлы (см.
+``images.release_images``).
+"""
+import hashlib
+import os
+import posixpath
+import re
+import time
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+CONTENT_NAME = r'([0-9a-f]{2})/\1[0-9a-f]{62}(?:\.\w+)?'
+
+
+def file_digest(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, content):
+        """Имя файла с содержимым ``content`` в каталоге ``name``."""
+        digest = file_digest(content)
+        directory, file_name = posixpath.split(name)
+        extension = posixpath.splitext(file_name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def is_content_name(self, name, directory):
+        """Является ли ``name`` именем файла, сохраненного в каталог
+        ``directory`` (без подкаталогов вроде копий изображений)."""
+        prefix = re.escape(posixpath.join(directory, ''))
+        return bool(re.fullmatch(prefix + CONTENT_NAME, name))
+
+    def has_content(self, name, content):
+        """Сохранено ли под именем ``name`` содержимое ``content``.
+        Сравнивает хэши без чтения сохраненного файла."""
+        digest = posixpath.splitext(posixpath.basename(name or ''))[0]
+        return digest == file_digest(content)
+
+    def touch(self, name):
+        """Обновить время изменения файла. Возвращает False, если файла
+        нет."""
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def is_recent(self, name, seconds):
+        """Изменялся ли файл за последние ``seconds`` секунд."""
+        try:
+            modified = os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return time.time() - modified < seconds
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.touch(name):
+            return name
+        return super().save(name, content, max_length)
@@ -0,0 +1,129 @@
+"""Битовые маски тэгов рецепта.
+
+Тэгу при сохранении выделяется свободный бит ``Tag.bit`` (см.
+``Tag.allocate_bit``), а в ``Recipe.tags_mask`` хранится объединение
+битов всех тэгов рецепта. Фильтр по тэгам сводится к одному условию
+``tags_mask & mask <> 0`` без join'а с таблицей связей и без DISTINCT.
+
+Битов ``TAG_MASK_BITS``; тэги сверх этого остаются без бита, и рецепты
+с ними отбираются подзапросом EXISTS по таблице связей. Бит удаленного
+тэга снимается с масок рецептов и выделяется следующему тэгу.
+
+Соответствие слаг -> бит кешируется в памяти процесса вместе с версией
+тэгов из общего кеша рецептов (см. ``cache``): после фиксации изменения
+тэгов версия увеличивается, и каждый процесс перечитывает тэги при
+следующем запросе. Без общего кеша соответствие живет не дольше
+``TAG_BITS_TTL`` секунд.
+"""
+import time
+from threading import Lock
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .cache import bump, recipes_cache
+from .models import Recipe, Tag
+
+VERSION_KEY = 'tags:version'
+
+_lock = Lock()
+_tags = None
+_version = None
+_loaded_at = 0
+
+
+def tags_mask(tags):
+    """Посчитать маску для набора тэгов."""
+    mask = 0
+    for tag in tags:
+        if tag.bit is not None:
+            mask |= 1 << tag.bit
+    return mask
+
+
+def _load_tags(version):
+    global _tags, _version, _loaded_at
+    _tags = {
+        slug: (pk, bit)
+        for pk, slug, bit in Tag.objects.values_list('pk', 'slug', 'bit')
+    }
+    _version = version
+    _loaded_at = time.monotonic()
+
+
+def get_tags():
+    """Получить закешированное в памяти соответствие слаг -> (id, бит).
+
+    У тэга без бита вместо бита None.
+    """
+    version = recipes_cache().get(VERSION_KEY)
+    ttl = getattr(settings, 'TAG_BITS_TTL', 10)
+    with _lock:
+        if (_tags is None or version != _version
+                or time.monotonic() - _loaded_at > ttl):
+            _load_tags(version)
+        return _tags
+
+
+def get_tag_choices():
+    """Варианты для фильтра по тэгам без запроса к базе."""
+    return [(slug, slug) for slug in get_tags()]
+
+
+def slugs_mask(slugs):
+    """Посчитать маску для списка слагов.
+
+    Возвращает маску и слаги тэгов без бита, которые в нее не вошли.
+    """
+    tags = get_tags()
+    mask = 0
+    unmasked = []
+    for slug in slugs:
+        if slug not in tags:
+            continue
+        bit = tags[slug][1]
+        if bit is None:
+            unmasked.append(slug)
+        else:
+            mask |= 1 << bit
+    return mask, unmasked
+
+
+def bit_hits(queryset, bit):
+    """Аннотировать рецепты битом ``bit`` их маски."""
+    return queryset.annotate(tag_bit=F('tags_mask').bitand(1 << bit))
+
+
+def set_tag_bit(tag):
+    """Добавить бит тэга в маски его рецептов, где бита еще нет."""
+    if tag.bit is None:
+        return
+    bit_hits(Recipe.objects.filter(tags=tag), tag.bit).filter(
+        tag_bit=0).update(tags_mask=F('tags_mask').bitor(1 << tag.bit))
+
+
+def clear_tag_bit(tag):
+    """Снять бит удаляемого тэга с масок рецептов."""
+    if tag.bit is None:
+        return
+    bit_hits(Recipe.objects.filter(tags=tag), tag.bit).filter(
+        tag_bit__gt=0).update(tags_mask=F('tags_mask') - (1 << tag.bit))
+
+
+def reset_tags():
+    global _tags
+    with _lock:
+        _tags = None
+
+
+def bump_tags_version():
+    bump(VERSION_KEY)
+    reset_tags()
+
+
+def invalidate_tag_bits():
+    """Сбросить кеш слагов во всех процессах после фиксации изменения
+    тэгов."""
+    reset_tags()
+    transaction.on_commit(bump_tags_version)
@@ -0,0 +1,665 @@
+import base64
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import (APIClient, APIRequestFactory,
+                                 force_authenticate)
+
+from . import tag_mask, throttling
+from .cache import get_or_revalidate, recipes_cache
+from .deletion import delete_in_chunks
+from .fast_list import RECIPE_FIELDS
+from .feed import follow_author
+from .ingredient_index import IngredientIndex, RankedRecipes
+from .management.commands._bench import (SerializerRecipeViewSet, bench_view,
+                                         render_response)
+from .models import (Favorite, Follow, Ingredient, IngredientInRecipe, Recipe,
+                     RecipeTombstone, ShoppingCart, Tag)
+from .serializers import FollowSerializer, subscription_data
+from .storage import ContentAddressedStorage
+from .throttling import acquire_pdf_slot, release_pdf_slot
+from .views import RecipeViewSet
+
+User = get_user_model()
+
+
+class FeedLimitTest(TestCase):
+    """Параметр ``limit`` ленты подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader')
+        author = User.objects.create(
+            email='author@example.com', username='author')
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Рецепт {num}', text='Текст',
+                   image='recipe.png', cooking_time=10)
+            for num in range(3)
+        )
+        Follow.objects.create(user=cls.user, author=author)
+        follow_author(cls.user.pk, author.pk)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_feed(self, limit):
+        response = self.client.get('/api/recipes/feed/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_negative_limit(self):
+        data = self.get_feed(-3)
+        self.assertEqual(len(data['results']), 1)
+        self.assertIsNotNone(data['next'])
+
+    def test_non_numeric_limit(self):
+        data = self.get_feed('abc')
+        self.assertEqual(len(data['results']), 3)
+        self.assertIsNone(data['next'])
+
+
+class SubscribeResponseTest(TestCase):
+    """Ответ на подписку без повторного чтения подписки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader')
+        cls.author = User.objects.create(
+            email='author@example.com', username='author')
+        Recipe.objects.bulk_create(
+            Recipe(author=cls.author, name=f'Рецепт {num}', text='Текст',
+                   image='recipe.png', cooking_time=10 + num)
+            for num in range(3)
+        )
+
+    def subscribe(self, params):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(
+            f'/api/users/{self.author.pk}/subscribe/'
+            + (f'?recipes_limit={params}' if params is not None else ''))
+        self.assertEqual(response.status_code, 201)
+        follow = Follow.objects.get(user=self.user, author=self.author)
+        request = APIRequestFactory().get(
+            '/', {} if params is None else {'recipes_limit': params})
+        force_authenticate(request, self.user)
+        expected = FollowSerializer(
+            follow, context={'request': Request(request)}).data
+        self.assertEqual(response.json(), json.loads(json.dumps(expected)))
+        return response.json()
+
+    def test_matches_follow_serializer(self):
+        for params in (None, 1, 0):
+            with self.subTest(recipes_limit=params):
+                data = self.subscribe(params)
+                self.assertEqual(data['recipes_count'], 3)
+                Follow.objects.all().delete()
+
+    def test_single_query(self):
+        request = APIRequestFactory().get('/', {'recipes_limit': 2})
+        with self.assertNumQueries(1):
+            data = subscription_data(self.author, Request(request))
+        self.assertEqual(len(data['recipes']), 2)
+        self.assertEqual(data['recipes_count'], 3)
+        self.assertTrue(data['is_subscribed'])
+
+
+class BrowsableAPITest(TestCase):
+    """Список рецептов из готовых документов в браузерном API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            email='author@example.com', username='author')
+        Recipe.objects.create(
+            author=author, name='Борщ', text='Текст',
+            image='recipe.png', cooking_time=10)
+
+    def test_format_api(self):
+        for url in ('/api/recipes/?format=api', '/api/recipes/?page=1'):
+            response = self.client.get(url, HTTP_ACCEPT='text/html')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Борщ', response.content.decode())
+
+
+def png_base64(color):
+    """Изображение 1x1 одного цвета в формате поля ``image``."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (1, 1), color).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class RecipeImageUpdateTest(TestCase):
+    """Изображение рецепта переписывается, только если оно изменилось."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author')
+        cls.tag = Tag.objects.create(
+            name='Обед', slug='lunch', color='#000001')
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def payload(self, image):
+        return {
+            'name': 'Суп', 'text': 'Текст', 'cooking_time': 10,
+            'image': image, 'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 5}],
+        }
+
+    def test_same_image_is_not_saved_again(self):
+        response = self.client.post(
+            '/api/recipes/', self.payload(png_base64('red')), format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        url = f'/api/recipes/{recipe.pk}/'
+        with mock.patch.object(ContentAddressedStorage, 'save') as save:
+            response = self.client.patch(
+                url, self.payload(png_base64('red')), format='json')
+        self.assertEqual(response.status_code, 200)
+        save.assert_not_called()
+        response = self.client.patch(
+            url, self.payload(png_base64('blue')), format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(
+            Recipe.objects.get(pk=recipe.pk).image.name, recipe.image.name)
+
+
+class IngredientIndexTest(SimpleTestCase):
+    """Фоновая сборка индекса ингредиентов и ранжированная выдача."""
+
+    def test_negative_index(self):
+        ranked = RankedRecipes(
+            np.array([1, 2, 3]), np.array([1, 2, 2]), np.array([2, 2, 3]))
+        self.assertEqual(ranked[-1], ranked[len(ranked) - 1])
+        self.assertEqual(ranked[-3], ranked[0])
+        with self.assertRaises(IndexError):
+            ranked[-4]
+        with self.assertRaises(IndexError):
+            ranked[3]
+
+    def test_failed_build_resets_flag(self):
+        index = IngredientIndex()
+        index._building = True
+        index._pending.append((1, (), (2,)))
+        with mock.patch.object(index, 'build', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                index._build_in_thread()
+        self.assertFalse(index._building)
+        self.assertEqual(index._pending, [])
+
+
+class TagMaskTest(TestCase):
+    """Фильтр по тэгам через маску после создания и удаления тэгов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author')
+
+    def create_tag(self, slug):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Tag.objects.create(
+                name=slug, slug=slug, color=f'#{len(slug):06d}')
+
+    def create_recipe(self, name, tags):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, text='Текст',
+            image='recipe.png', cooking_time=10,
+            tags_mask=tag_mask.tags_mask(tags))
+        recipe.tags.set(tags)
+        return recipe
+
+    def filtered(self, *slugs):
+        response = self.client.get('/api/recipes/', {'tags': slugs})
+        self.assertEqual(response.status_code, 200)
+        return {recipe['name'] for recipe in response.json()['results']}
+
+    def test_deleted_tag_bit_is_reused(self):
+        soup = self.create_tag('soup')
+        salad = self.create_tag('salads')
+        self.create_recipe('Борщ', [soup])
+        self.create_recipe('Оливье', [salad])
+        # Документы рецептов пересобираются в фоновом потоке, который не
+        # видит транзакцию теста; список отдаст их, собрав заново.
+        with mock.patch('foodgram.documents.rebuild_in_background'):
+            with self.captureOnCommitCallbacks(execute=True):
+                soup.delete()
+        dessert = self.create_tag('dessert')
+        self.assertEqual(dessert.bit, 0)
+        self.create_recipe('Торт', [dessert])
+        self.assertEqual(self.filtered('dessert'), {'Торт'})
+        self.assertEqual(self.filtered('salads'), {'Оливье'})
+
+    def test_tag_created_in_another_process(self):
+        self.create_tag('soup')
+        tag_mask.get_tags()
+        stale = (tag_mask._tags, tag_mask._version)
+        drink = self.create_tag('drinks')
+        # Другой процесс держит соответствие слагов до создания тэга.
+        tag_mask._tags, tag_mask._version = stale
+        self.create_recipe('Морс', [drink])
+        self.assertEqual(self.filtered('drinks'), {'Морс'})
+
+    def test_concurrent_bit_allocation(self):
+        taken = self.create_tag('soup')
+        allocate = Tag.allocate_bit
+
+        def stale_allocate(tag):
+            # Первая попытка видит бит свободным, как параллельный запрос.
+            tag.bit = taken.bit
+            patcher.stop()
+
+        patcher = mock.patch.object(Tag, 'allocate_bit', stale_allocate)
+        patcher.start()
+        tag = self.create_tag('salads')
+        self.assertIsNot(Tag.allocate_bit, stale_allocate)
+        self.assertEqual(Tag.allocate_bit, allocate)
+        self.assertEqual(tag.bit, 1)
+
+
+@override_settings(THROTTLE={'PDF_CONCURRENCY': 1, 'PDF_RETRY_SECONDS': 7})
+class PDFSlotTest(TestCase):
+    """Отрисовка pdf без свободного слота."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_busy_slot_fails_fast(self):
+        slot = acquire_pdf_slot()
+        try:
+            response = self.client.get('/api/recipes/download_shopping_cart/')
+        finally:
+            release_pdf_slot(slot)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '7')
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(THROTTLE={
+    'CAPACITY': 5, 'REFILL_RATE': 0.001,
+    'HEAVY_CAPACITY': 20, 'HEAVY_REFILL_RATE': 0.001,
+})
+class ThrottleBudgetTest(TestCase):
+    """Отдельные корзины для дорогих и обычных запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Борщ', text='Текст',
+            image='recipe.png', cooking_time=10)
+
+    def setUp(self):
+        throttling._stores.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_expensive_requests_do_not_starve_cheap_ones(self):
+        self.assertEqual(
+            self.client.get('/api/recipes/export/').status_code, 200)
+        response = self.client.get('/api/recipes/export/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+
+    def test_cheap_budget(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        codes = [self.client.get(url).status_code for _ in range(6)]
+        self.assertEqual(codes, [200] * 5 + [429])
+
+    def test_anonymous_clients_behind_proxy(self):
+        client = APIClient(REMOTE_ADDR='172.18.0.2')
+
+        def get(address):
+            return client.get(
+                '/api/recipes/', HTTP_X_FORWARDED_FOR=address).status_code
+
+        codes = [get('203.0.113.1') for _ in range(6)]
+        self.assertEqual(codes, [200] * 5 + [429])
+        self.assertEqual(get('203.0.113.2'), 200)
+
+
+class RevalidateTest(TestCase):
+    """Пересчет записи кеша, которую считает другой запрос."""
+
+    def setUp(self):
+        recipes_cache().clear()
+
+    def test_locked_key_without_entry_is_computed(self):
+        recipes_cache().add('page:lock', True, 10)
+        self.addCleanup(recipes_cache().delete, 'page:lock')
+        started = time.monotonic()
+        value = get_or_revalidate('page', lambda: 'fresh', 60, 30, 10)
+        self.assertEqual(value, 'fresh')
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_locked_key_serves_stale_entry(self):
+        get_or_revalidate('page', lambda: 'old', 0, 30, 10)
+        recipes_cache().add('page:lock', True, 10)
+        self.addCleanup(recipes_cache().delete, 'page:lock')
+        value = get_or_revalidate('page', lambda: 'new', 60, 30, 10)
+        self.assertEqual(value, 'old')
+
+
+@override_settings(RECIPE_CHANGES_LAG_SECONDS=0)
+class RecipeChangesTest(TestCase):
+    """Курсор синхронизации и отметки об удалении рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author')
+
+    def create_recipe(self, name):
+        with mock.patch('foodgram.signals.schedule_variants'):
+            return Recipe.objects.create(
+                author=self.author, name=name, text='Текст',
+                image='recipe.png', cooking_time=10)
+
+    def changes(self, cursor=None):
+        params = {} if cursor is None else {'cursor': cursor}
+        response = self.client.get('/api/recipes/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_first_empty_call_returns_cursor(self):
+        data = self.changes()
+        self.assertIsNotNone(data['cursor'])
+        self.assertFalse(data['has_more'])
+        recipe = self.create_recipe('Борщ')
+        data = self.changes(data['cursor'])
+        self.assertEqual(
+            [item['id'] for item in data['changed']], [recipe.pk])
+
+    def test_deleted_recipes(self):
+        kept = self.create_recipe('Борщ')
+        removed = self.create_recipe('Щи')
+        data = self.changes()
+        self.assertEqual(
+            {item['id'] for item in data['changed']}, {kept.pk, removed.pk})
+        removed_id = removed.pk
+        removed.delete()
+        data = self.changes(data['cursor'])
+        self.assertEqual(data['changed'], [])
+        self.assertEqual(data['deleted'], [removed_id])
+        data = self.changes(data['cursor'])
+        self.assertEqual((data['changed'], data['deleted']), ([], []))
+
+    @override_settings(RECIPE_CHANGES_TOMBSTONE_DAYS=30)
+    def test_old_position_of_synced_client_is_valid(self):
+        recipe = self.create_recipe('Борщ')
+        Recipe.objects.filter(pk=recipe.pk).update(
+            updated_at=timezone.now() - timedelta(days=40))
+        cursor = self.changes()['cursor']
+        self.assertEqual(self.changes(cursor)['changed'], [])
+        with mock.patch('django.utils.timezone.now',
+                        return_value=timezone.now() + timedelta(days=31)):
+            response = self.client.get(
+                '/api/recipes/changes/', {'cursor': cursor})
+        self.assertEqual(response.status_code, 410)
+
+
+REPLICA = 'replica_test'
+
+
+@override_settings(DATABASE_ROUTING={'REPLICAS': [REPLICA], 'PIN_SECONDS': 60})
+class ReplicaPinningTest(TransactionTestCase):
+    """Чтение с реплики и закрепление за основной базой после записи.
+
+    Реплика - отдельная база SQLite только с таблицами тэгов и удаленных
+    рецептов, которая не получает изменений основной базы, как отстающая
+    реплика.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Реплика подключается после setUpClass, иначе тестовый раннер
+        # пытается создать для нее тестовую базу.
+        super().setUpClass()
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.databases[REPLICA] = dict(
+            connections.databases['default'], NAME=cls.replica_path)
+        connections.ensure_defaults(REPLICA)
+        connections.prepare_test_settings(REPLICA)
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(Tag)
+            editor.create_model(RecipeTombstone)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        os.remove(cls.replica_path)
+        super().tearDownClass()
+
+    def setUp(self):
+        recipes_cache().clear()
+        Tag.objects.create(name='Суп', slug='soup', color='#000001')
+        self.writer = self.user_client('writer')
+        self.reader = self.user_client('reader')
+        # Файла изображения нет, копии не строятся.
+        with mock.patch('foodgram.signals.schedule_variants'):
+            self.recipe = Recipe.objects.create(
+                author=User.objects.get(username='reader'), name='Борщ',
+                text='Текст', image='recipe.png', cooking_time=10)
+
+    def user_client(self, username):
+        user = User.objects.create(
+            email=f'{username}@example.com', username=username)
+        token = Token.objects.create(user=user)
+        return APIClient(
+            REMOTE_ADDR='203.0.113.1',
+            HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def tag_slugs(self, client):
+        response = client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        return [tag['slug'] for tag in response.json()]
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.tag_slugs(self.writer), [])
+        self.assertEqual(self.tag_slugs(APIClient()), [])
+
+    def test_writer_is_pinned_by_user_id(self):
+        response = self.writer.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.tag_slugs(self.writer), ['soup'])
+        # Другие клиенты с того же адреса по-прежнему читают с реплики.
+        self.assertEqual(self.tag_slugs(self.reader), [])
+        self.assertEqual(
+            self.tag_slugs(APIClient(REMOTE_ADDR='203.0.113.1')), [])
+
+    @override_settings(DELETION_CHUNK_SIZE=2)
+    def test_delete_in_chunks_keeps_database(self):
+        for database in ('default', REPLICA):
+            RecipeTombstone.objects.using(database).bulk_create(
+                RecipeTombstone(recipe_id=num) for num in range(5))
+        deleted = delete_in_chunks(RecipeTombstone.objects.using(REPLICA))
+        self.assertEqual(deleted, 5)
+        self.assertFalse(RecipeTombstone.objects.using(REPLICA).exists())
+        self.assertEqual(
+            RecipeTombstone.objects.using('default').count(), 5)
+
+
+CONTRACT_ALPHABET = (
+    'abcxyzАБВабвгдеёжзЯя0123456789 '
+    '"\\/<>&\'\t\n\x01\x1f\x7f\u2028\u2029é€😀'
+)
+
+
+def random_text(rnd, length):
+    return ''.join(rnd.choice(CONTRACT_ALPHABET) for _ in range(length))
+
+
+def results_part(response):
+    """Часть ответа без ссылок пагинации: в них попадает ``fields``."""
+    return response.split(b'"results":', 1)[-1]
+
+
+class RecipeListContractTest(TestCase):
+    """Ответы списка и рецепта через сериализаторы DRF и через быстрый
+    путь (из документов и с явным списком всех полей) совпадают байт в
+    байт на случайных данных."""
+
+    RECIPES = 300
+    USERS = 20
+    REQUESTS = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(0)
+        cls.tags = [
+            Tag.objects.create(
+                name=f'{random_text(rnd, 8)} {num}',
+                color=f'#{rnd.getrandbits(24):06X}',
+                slug=f'contract-{num}',
+            )
+            for num in range(6)
+        ]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=random_text(rnd, 12),
+                       measurement_unit=random_text(rnd, 3))
+            for _ in range(40)
+        )
+        ingredients = list(Ingredient.objects.all())
+        User.objects.bulk_create(
+            User(email=f'contract-{num}@example.com',
+                 username=f'contract-{num}',
+                 first_name=random_text(rnd, 10),
+                 last_name=random_text(rnd, 10))
+            for num in range(cls.USERS)
+        )
+        cls.users = list(User.objects.order_by('pk'))
+        now = timezone.now()
+        chosen_tags = [rnd.sample(cls.tags, rnd.randint(0, 3))
+                       for _ in range(cls.RECIPES)]
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=rnd.choice(cls.users),
+                name=f'{num} {random_text(rnd, 20)}',
+                text=random_text(rnd, rnd.randint(0, 200)),
+                image=rnd.choice(
+                    ['', 'foodgram/media/a b.png', 'foodgram/media/я.jpg']),
+                cooking_time=rnd.randint(1, 500),
+                pub_date=now - timedelta(seconds=num),
+                tags_mask=tag_mask.tags_mask(chosen_tags[num]),
+            )
+            for num in range(cls.RECIPES)
+        )
+        recipes = {
+            int(name.split()[0]): pk
+            for pk, name in Recipe.objects.values_list('pk', 'name')
+        }
+        cls.recipes = list(recipes.values())
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipes[num], tag_id=tag.pk)
+            for num, recipe_tags in enumerate(chosen_tags)
+            for tag in recipe_tags
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe_id=pk, ingredient=ingredient,
+                               amount=rnd.randint(1, 5000))
+            for pk in cls.recipes
+            for ingredient in rnd.sample(ingredients, rnd.randint(0, 8))
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=user, recipe_id=pk)
+                for user in cls.users
+                for pk in rnd.sample(cls.recipes, 10)
+            )
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author)
+            for user in cls.users
+            for author in rnd.sample(cls.users, 3) if author != user
+        )
+
+    def render(self, view, path, params, user, **kwargs):
+        request = APIRequestFactory().get(path, params)
+        if user is not None:
+            force_authenticate(request, user)
+        response = render_response(view, request, **kwargs)
+        if 'fields' in params:
+            return results_part(response)
+        return response
+
+    def variants(self, action):
+        actions = {'get': action}
+        return ((bench_view(SerializerRecipeViewSet, actions), {}),
+                (bench_view(RecipeViewSet, actions), {}),
+                (bench_view(RecipeViewSet, actions),
+                 {'fields': ','.join(RECIPE_FIELDS)}))
+
+    def test_fast_path_matches_serializers(self):
+        rnd = random.Random(1)
+        list_views = self.variants('list')
+        detail_views = self.variants('retrieve')
+        for num in range(self.REQUESTS):
+            params = {'page': rnd.randint(1, 5),
+                      'limit': rnd.choice([1, 6, 20, 50])}
+            if rnd.random() < 0.5:
+                params['tags'] = [
+                    tag.slug
+                    for tag in rnd.sample(self.tags, rnd.randint(1, 3))]
+            if rnd.random() < 0.3:
+                params['author'] = rnd.choice(self.users).pk
+            if rnd.random() < 0.3:
+                params[rnd.choice(
+                    ['is_favorited', 'is_in_shopping_cart'])] = 1
+            user = rnd.choice(self.users + [None])
+            pk = rnd.choice(self.recipes)
+            for path, views, kwargs in (
+                    ('/api/recipes/', list_views, {}),
+                    (f'/api/recipes/{pk}/', detail_views, {'pk': pk})):
+                expected = self.render(views[0][0], path, params, user,
+                                       **kwargs)
+                for view, extra in views[1:]:
+                    response = self.render(
+                        view, path, {**params, **extra}, user, **kwargs)
+                    if extra:
+                        expected = results_part(expected)
+                    self.assertEqual(
+                        response, expected,
+                        f'Запрос {num} {path} ({params}, {user})')
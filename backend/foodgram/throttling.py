@@ -0,0 +1,200 @@
+"""Ограничение частоты запросов с учетом их стоимости.
+
+У каждого пользователя (анонима - по IP) есть корзина на
+``THROTTLE['CAPACITY']`` токенов, которая пополняется со скоростью
+``REFILL_RATE`` токенов в секунду. Запрос забирает столько токенов,
+сколько стоит: представление может задать стоимость методом
+``get_throttle_cost(request)``, иначе запрос стоит один токен. Если
+токенов не хватает, запрос получает ответ 429 с ``Retry-After``.
+
+Дорогие запросы (стоимостью больше одного токена: выгрузка, pdf, поиск
+по ингредиентам, глубокие страницы) тратят отдельную корзину на
+``HEAVY_CAPACITY`` токенов с пополнением ``HEAVY_REFILL_RATE``, поэтому
+не отнимают токены у обычных чтений и записей.
+
+Ограничение подключается к дорогим представлениям через
+``throttle_classes``, а не ко всем сразу. Аноним определяется по адресу
+клиента из X-Forwarded-For (``NUM_PROXIES`` в ``REST_FRAMEWORK``).
+
+Корзины хранятся в памяти процесса (``LocalBucketStore``) или в общем
+кеше (``CacheBucketStore``), класс хранилища задается в
+``THROTTLE['STORE']``.
+
+Отрисовку pdf одновременно выполняют не больше ``PDF_CONCURRENCY``
+запросов: они занимают слоты в кеше ``THROTTLE['CACHE']``. Чтобы
+ограничение действовало на все процессы, кеш должен быть общим
+(memcached, см. ``CACHES``), иначе ``check`` предупреждает. Запрос без
+свободного слота сразу получает 429 с ``Retry-After`` в
+``PDF_RETRY_SECONDS`` секунд и не занимает процесс ожиданием.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_THROTTLE = {
+    'CAPACITY': 60,
+    'REFILL_RATE': 1.0,
+    'HEAVY_CAPACITY': 60,
+    'HEAVY_REFILL_RATE': 1.0,
+    'STORE': 'foodgram.throttling.LocalBucketStore',
+    'MAX_BUCKETS': 100000,
+    'CACHE': 'default',
+    'PDF_CONCURRENCY': 2,
+    'PDF_RETRY_SECONDS': 5,
+    'PDF_RENDER_SECONDS': 60,
+}
+
+_stores = {}
+
+
+def throttle_setting(name):
+    return getattr(settings, 'THROTTLE', {}).get(
+        name, DEFAULT_THROTTLE[name])
+
+
+class LocalBucketStore:
+    """Корзины в памяти процесса.
+
+    Корзина - список [токены, время обновления], который меняется на
+    месте. Когда корзин больше ``MAX_BUCKETS``, удаляется самая старая
+    по времени создания: полная корзина и отсутствующая равнозначны.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, cost, capacity, rate, now):
+        """Забрать ``cost`` токенов. Возвращает 0, если токенов хватило,
+        иначе через сколько секунд их станет достаточно."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= throttle_setting('MAX_BUCKETS'):
+                    del self._buckets[next(iter(self._buckets))]
+                bucket = self._buckets[key] = [capacity, now]
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return 0
+            bucket[0] = tokens
+            return (cost - tokens) / rate
+
+
+class CacheBucketStore:
+    """Корзины в общем кеше ``THROTTLE['CACHE']``.
+
+    Атомарного чтения-записи в кеше нет, поэтому корзина приближается
+    скользящим окном длиной ``CAPACITY / REFILL_RATE`` секунд: расход
+    окна - счетчик, который меняется атомарными ``add``/``incr``, а из
+    расхода предыдущего окна учитывается еще не истекшая доля. Запрос,
+    которому не хватило токенов, возвращает свой расход ``decr``.
+    Одновременные запросы не могут потратить одни и те же токены.
+    """
+
+    def spend(self, cache, key, cost, timeout):
+        if cache.add(key, cost, timeout):
+            return cost
+        try:
+            return cache.incr(key, cost)
+        except ValueError:
+            # Счетчик истек между add и incr.
+            cache.add(key, 0, timeout)
+            return cache.incr(key, cost)
+
+    def take(self, key, cost, capacity, rate, now):
+        cache = caches[throttle_setting('CACHE')]
+        window = capacity / rate
+        index, elapsed = divmod(now / window, 1)
+        key = f'throttle:{key}:'
+        current_key = f'{key}{int(index)}'
+        cost = math.ceil(cost)
+        spent = self.spend(cache, current_key, cost, int(2 * window) + 1)
+        previous = cache.get(f'{key}{int(index) - 1}', 0)
+        if previous * (1 - elapsed) + spent <= capacity:
+            return 0
+        cache.decr(current_key, cost)
+        if spent > capacity or not previous:
+            return (1 - elapsed) * window
+        # Токенов станет достаточно, когда доля предыдущего окна
+        # уменьшится до capacity - spent.
+        return (1 - (capacity - spent) / previous - elapsed) * window
+
+
+def get_store():
+    path = throttle_setting('STORE')
+    if path not in _stores:
+        _stores[path] = import_string(path)()
+    return _stores[path]
+
+
+class CostThrottle(BaseThrottle):
+    """Ограничение частоты запросов корзиной токенов с учетом стоимости."""
+
+    def get_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        get_cost = getattr(view, 'get_throttle_cost', None)
+        cost = get_cost(request) if get_cost is not None else 1
+        if cost > 1:
+            key = 'heavy:' + self.get_key(request)
+            capacity = throttle_setting('HEAVY_CAPACITY')
+            rate = throttle_setting('HEAVY_REFILL_RATE')
+        else:
+            key = self.get_key(request)
+            capacity = throttle_setting('CAPACITY')
+            rate = throttle_setting('REFILL_RATE')
+        self.delay = get_store().take(
+            key, min(cost, capacity), capacity, rate, time.time())
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class PDFBusy(Throttled):
+    default_detail = 'Сервер занят отрисовкой pdf, повторите запрос позже.'
+
+
+def acquire_pdf_slot():
+    """Занять свободный слот отрисовки pdf.
+
+    Возвращает ключ слота или None, если все слоты заняты.
+    """
+    cache = caches[throttle_setting('CACHE')]
+    for slot in range(throttle_setting('PDF_CONCURRENCY')):
+        key = f'throttle:pdf:{slot}'
+        if cache.add(key, True, throttle_setting('PDF_RENDER_SECONDS')):
+            return key
+    return None
+
+
+def release_pdf_slot(key):
+    caches[throttle_setting('CACHE')].delete(key)
+
+
+def pdf_busy():
+    return PDFBusy(wait=throttle_setting('PDF_RETRY_SECONDS'))
+
+
+@contextmanager
+def pdf_slot():
+    """Выполнить блок в слоте отрисовки pdf или сразу отказать с 429."""
+    key = acquire_pdf_slot()
+    if key is None:
+        raise pdf_busy()
+    try:
+        yield
+    finally:
+        release_pdf_slot(key)
@@ -0,0 +1,54 @@
+"""Уменьшенные копии изображений рецептов.
+
+Модуль не зависит от Django, чтобы копии можно было строить в
+отдельном процессе.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+VARIANTS = (
+    ('thumbnail', (160, 160)),
+    ('card', (480, 480)),
+    ('full', (1280, 1280)),
+)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+def has_alpha(image):
+    return (image.mode in ('RGBA', 'LA', 'PA')
+            or 'transparency' in image.info)
+
+
+def flatten(image):
+    """Положить изображение с прозрачностью на белый фон."""
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def render_variants(data):
+    """Построить копии изображения.
+
+    Возвращает словарь вариант -> формат -> содержимое файла. Копии не
+    больше исходного изображения.
+    """
+    variants = {}
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        source = source.convert('RGBA' if has_alpha(source) else 'RGB')
+        for variant, size in VARIANTS:
+            image = source.copy()
+            image.thumbnail(size, Image.LANCZOS)
+            variants[variant] = {}
+            for extension, image_format, options in FORMATS:
+                buffer = io.BytesIO()
+                frame = image if image_format == 'WEBP' else flatten(image)
+                frame.save(buffer, image_format, **options)
+                variants[variant][extension] = buffer.getvalue()
+    return variants
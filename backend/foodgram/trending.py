@@ -0,0 +1,94 @@
+"""Популярные рецепты.
+
+Добавления в избранное и в список покупок считаются счетчиками по часам
+(``RecipeActivity``): переключение меняет счетчик текущего часа на +1
+или -1. Команда ``update_trending`` периодически сворачивает счетчики за
+последние ``RECIPE_TRENDING_WINDOW_HOURS`` часов в оценку с затуханием
+(вклад часа убывает вдвое каждые ``HALF_LIFE_HOURS`` часов) и сохраняет
+``SIZE`` лучших рецептов в ``TrendingRecipe``. Запрос
+``?ordering=trending`` читает только эту таблицу, поэтому его стоимость
+не зависит от размера таблиц избранного и покупок.
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import invalidate_recipes
+from .models import Favorite, RecipeActivity, ShoppingCart, TrendingRecipe
+
+COUNTERS = {Favorite: 'favorites', ShoppingCart: 'carts'}
+
+
+def trending_setting(name, default):
+    return getattr(settings, f'RECIPE_TRENDING_{name}', default)
+
+
+def current_bucket(moment=None):
+    moment = moment or timezone.now()
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def count_activity(model, recipe_ids, delta):
+    """Изменить на ``delta`` счетчик текущего часа у рецептов.
+
+    ``model`` - ``Favorite`` или ``ShoppingCart``. Два запроса на любое
+    число рецептов: недостающие строки создаются, затем счетчики
+    увеличиваются одним UPDATE.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    bucket = current_bucket()
+    counter = COUNTERS[model]
+    RecipeActivity.objects.bulk_create(
+        (RecipeActivity(recipe_id=recipe_id, bucket=bucket)
+         for recipe_id in recipe_ids),
+        ignore_conflicts=True
+    )
+    RecipeActivity.objects.filter(
+        bucket=bucket, recipe_id__in=recipe_ids
+    ).update(**{counter: F(counter) + delta})
+
+
+def recipe_scores(now=None):
+    """Оценки рецептов с активностью в окне; счетчики старше окна
+    удаляются."""
+    now = now or timezone.now()
+    since = current_bucket(now) - timedelta(
+        hours=trending_setting('WINDOW_HOURS', 7 * 24))
+    RecipeActivity.objects.filter(bucket__lt=since).delete()
+    half_life = trending_setting('HALF_LIFE_HOURS', 24)
+    favorite_weight = trending_setting('FAVORITE_WEIGHT', 1.0)
+    cart_weight = trending_setting('CART_WEIGHT', 2.0)
+    scores = defaultdict(float)
+    activity = RecipeActivity.objects.filter(bucket__gte=since).values_list(
+        'recipe_id', 'bucket', 'favorites', 'carts')
+    for recipe_id, bucket, favorites, carts in activity.iterator():
+        age = (now - bucket).total_seconds() / 3600
+        scores[recipe_id] += (
+            favorite_weight * favorites + cart_weight * carts
+        ) * 0.5 ** (age / half_life)
+    return scores
+
+
+def update_trending(now=None):
+    """Пересчитать список популярных рецептов. Возвращает его длину."""
+    scores = recipe_scores(now)
+    top = heapq.nlargest(
+        trending_setting('SIZE', 100),
+        ((score, -recipe_id) for recipe_id, score in scores.items()
+         if score > 0)
+    )
+    with transaction.atomic():
+        TrendingRecipe.objects.all().delete()
+        TrendingRecipe.objects.bulk_create(
+            TrendingRecipe(recipe_id=-recipe_id, rank=rank, score=score)
+            for rank, (score, recipe_id) in enumerate(top, 1)
+        )
+        invalidate_recipes()
+    return len(top)
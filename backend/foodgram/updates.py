@@ -0,0 +1,32 @@
+"""Обновление производных данных рецепта после записи.
+
+Маска тэгов, индекс ингредиентов, сигнатура похожих рецептов и документ
+рецепта зависят от его тэгов и ингредиентов, которые пишутся после
+самого рецепта, поэтому сигналом ``post_save`` их не обновить. Все пути
+записи рецепта (API и админка) вызывают ``refresh_recipe`` после того,
+как записаны связи.
+"""
+from .documents import refresh_documents
+from .ingredient_index import ingredient_index
+from .models import Recipe
+from .similarity import update_recipe_signature
+from .tag_mask import tags_mask
+
+
+def refresh_recipe(recipe, old_ingredient_ids=(), ingredient_ids=None):
+    """Обновить производные данные рецепта в текущей транзакции.
+
+    ``old_ingredient_ids`` - ингредиенты рецепта до записи,
+    ``ingredient_ids`` - после; если не переданы, читаются из базы.
+    """
+    mask = tags_mask(recipe.tags.all())
+    if mask != recipe.tags_mask:
+        Recipe.objects.filter(pk=recipe.pk).update(tags_mask=mask)
+        recipe.tags_mask = mask
+    if ingredient_ids is None:
+        ingredient_ids = list(recipe.ingredientinrecipe_set.values_list(
+            'ingredient_id', flat=True))
+    ingredient_index.update_recipe(
+        recipe.pk, old_ingredient_ids, ingredient_ids)
+    update_recipe_signature(recipe.pk, ingredient_ids)
+    refresh_documents([recipe.pk])
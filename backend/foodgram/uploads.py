@@ -0,0 +1,62 @@
+"""Потоковая загрузка изображений рецептов.
+
+Файл принимается телом запроса (``Content-Type: image/*``, имя можно
+передать в ``Content-Disposition``) или частью ``image`` multipart-формы
+и по частям пишется во временный файл, не накапливаясь в памяти.
+Загрузка больше ``RECIPE_IMAGE_MAX_UPLOAD_SIZE`` байт прерывается с
+ответом 413.
+"""
+import mimetypes
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import FileUploadParser
+
+# Запас на заголовки частей multipart-формы.
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def max_upload_size():
+    return getattr(
+        settings, 'RECIPE_IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Файл слишком большой'
+    default_code = 'upload_too_large'
+
+
+class CappedUploadHandler(TemporaryFileUploadHandler):
+    """Обработчик загрузки во временный файл с ограничением размера."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = 0
+
+    def handle_raw_input(self, input_data, meta, content_length, boundary,
+                         encoding=None):
+        if content_length > max_upload_size() + MULTIPART_OVERHEAD:
+            raise UploadTooLarge
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_upload_size():
+            self.file.close()
+            raise UploadTooLarge
+        return super().receive_data_chunk(raw_data, start)
+
+
+class RawImageUploadParser(FileUploadParser):
+    """Изображение в теле запроса; имя файла необязательно."""
+
+    media_type = 'image/*'
+
+    def get_filename(self, stream, media_type, parser_context):
+        file_name = super().get_filename(stream, media_type, parser_context)
+        if file_name:
+            return file_name
+        extension = mimetypes.guess_extension(media_type.split(';')[0])
+        return 'upload' + (extension or '')
@@ -1,23 +1,103 @@
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
+from .changes import read_changes
 from .custom_mixins import RetrieveListViewSet
+from .export import CONTENT_TYPE, FILE_NAME, export_lines
+from .facets import recipe_facets
+from .fast_list import (RECIPE_FIELDS, extend_item, in_order,
+                        recipe_fields_items, recipe_list_items, recipe_version)
+from .feed import fanout_recipe, read_feed
 from .filters import IngredientsFilter, RecipeFilter
+from .image_urls import image_url
+from .ingredient_index import find_by_ingredients
 from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
                      ShoppingCart, Tag)
+from .page_cache import cached_page
 from .pagination import CustomPageNumberPaginator
+from .pdf import render_shopping_list_pdf
 from .permissions import AuthorOrReadOnly
-from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          RecipeCreateSerializer, RecipeListSerializer,
+from .renderers import ORJSONRenderer
+from .serializers import (FavoriteSerializer, ImageUploadSerializer,
+                          IngredientSearchSerializer, IngredientSerializer,
+                          RecipeBatchSerializer, RecipeCreateSerializer,
+                          RecipeFacetsSerializer, RecipeFieldsSerializer,
+                          RecipeIdsSerializer, RecipeListSerializer,
                           ShoppingCartSerializer, TagSerializer)
+from .similarity import find_similar
+from .throttling import CostThrottle, pdf_slot
+from .trending import count_activity
+from .uploads import CappedUploadHandler, RawImageUploadParser
+
+MAX_SIMILAR_RECIPES = 50
+MAX_FEED_PAGE_SIZE = 50
+MAX_CHANGES_BATCH = 100
+# Стоимость запросов для ограничения частоты (см. ``throttling``).
+RECIPE_ACTION_COSTS = {
+    'download_shopping_cart': 10,
+    'export': 20,
+    'by_ingredients': 5,
+    'similar': 3,
+    'upload_image': 5,
+    'favorite_batch': 3,
+    'shopping_cart_batch': 3,
+}
+UNFILTERED_INGREDIENTS_COST = 5
+DEEP_PAGE_ROWS = 1000
+MAX_DEEP_PAGE_COST = 20
+
+
+def get_shopping_list(user):
+    """Собрать ингредиенты из корзины пользователя с суммой количества."""
+    shopping_list = {}
+    ingredients = IngredientInRecipe.objects.filter(
+        recipe__cart__user=user).values_list(
+            'ingredient__name',
+            'amount',
+            'ingredient__measurement_unit',
+            named=True)
+    for ingredient in ingredients:
+        name = ingredient.ingredient__name
+        measurement_unit = ingredient.ingredient__measurement_unit
+        amount = ingredient.amount
+        if name not in shopping_list:
+            shopping_list[name] = {
+                'measurement_unit': measurement_unit,
+                'amount': amount
+            }
+        else:
+            shopping_list[name]['amount'] += amount
+    return shopping_list
+
+
+def query_limit(request, default, maximum):
+    """Параметр ``limit`` запроса, приведенный к диапазону 1..maximum."""
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        limit = default
+    return min(max(limit, 1), maximum)
+
+
+def pdf_response(content, file_name='ShoppingList'):
+    response = HttpResponse(content, content_type='application/pdf')
+    content_disposition = f'attachment; filename="{file_name}.pdf"'
+    response['Content-Disposition'] = content_disposition
+    return response
+
+
+def export_response(content):
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{FILE_NAME}"'
+    return response
 
 
 class IngredientViewSet(RetrieveListViewSet):
@@ -29,6 +109,13 @@ class IngredientViewSet(RetrieveListViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientsFilter
     pagination_class = None
+    throttle_classes = (CostThrottle,)
+
+    def get_throttle_cost(self, request):
+        """Полный список ингредиентов дороже поиска по началу имени."""
+        if self.action == 'list' and not request.query_params.get('name'):
+            return UNFILTERED_INGREDIENTS_COST
+        return 1
 
 
 class TagViewSet(RetrieveListViewSet):
@@ -48,6 +135,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (AuthorOrReadOnly, )
     filterset_class = RecipeFilter
     pagination_class = CustomPageNumberPaginator
+    throttle_classes = (CostThrottle,)
+    # Рецепты из документов - готовый JSON (``RawJSON``), его умеет
+    # выводить только ORJSONRenderer; BrowsableAPIRenderer тоже берет
+    # первый рендерер из этого списка.
+    renderer_classes = (ORJSONRenderer, BrowsableAPIRenderer)
+    # Кешировать ответы со списком и рецептом для анонимов.
+    cache_pages = True
 
     def get_serializer_class(self):
         """Выбрать сериализатор."""
@@ -55,9 +149,317 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeListSerializer
         return RecipeCreateSerializer
 
+    def get_throttle_cost(self, request):
+        """Стоимость запроса для ограничения частоты.
+
+        Глубокая страница списка дороже: OFFSET читает и отбрасывает все
+        предыдущие строки.
+        """
+        cost = RECIPE_ACTION_COSTS.get(self.action, 1)
+        if self.action != 'list':
+            return cost
+        try:
+            page = int(request.query_params.get('page', 1))
+        except ValueError:
+            return cost
+        page_size = self.paginator.get_page_size(request) or 0
+        offset = max(page - 1, 0) * page_size
+        return cost + min(offset // DEEP_PAGE_ROWS, MAX_DEEP_PAGE_COST)
+
+    def recipes_items(self, recipe_ids, compact=True):
+        """Данные рецептов с учётом параметров ``fields`` и ``compact``.
+
+        Возвращает словарь id -> рецепт и словарь для верхнего уровня
+        ответа.
+        """
+        params = RecipeFieldsSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        fields = params.validated_data.get('fields')
+        compact = compact and params.validated_data['compact']
+        if fields is None and not compact:
+            return recipe_list_items(recipe_ids, self.request), {}
+        return recipe_fields_items(
+            recipe_ids, self.request, fields or RECIPE_FIELDS, compact)
+
+    def recipes_data(self, recipe_ids, compact=True):
+        """Как ``recipes_items``, но рецепты списком в порядке id."""
+        recipe_ids = list(recipe_ids)
+        items, included = self.recipes_items(recipe_ids, compact)
+        return in_order(recipe_ids, items), included
+
+    def cached(self, build):
+        """Ответ ``build()`` через кеш страниц для анонимов."""
+        if not self.cache_pages:
+            return build()
+        return cached_page(self.request, build)
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов, собранный без сериализаторов DRF."""
+        return self.cached(lambda: self.list_response(request))
+
+    def list_response(self, request):
+        if 'ids' in request.query_params:
+            return self.batch_list(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        if 'facets' in request.query_params:
+            included = {'facets': self.facets(queryset)}
+        else:
+            included = {}
+        recipe_ids = queryset.values_list('pk', flat=True)
+        page = self.paginate_queryset(recipe_ids)
+        if page is None:
+            results, extra = self.recipes_data(recipe_ids)
+            included.update(extra)
+            if included:
+                return Response({'results': results, **included})
+            return Response(results)
+        results, extra = self.recipes_data(page)
+        included.update(extra)
+        response = self.get_paginated_response(results)
+        response.data.update(included)
+        return response
+
+    def facets(self, queryset):
+        """Счетчики рецептов по тэгам и авторам (``?facets=tags,author``)
+        для текущих фильтров; счетчики тэгов - без фильтра по тэгам."""
+        params = RecipeFacetsSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+
+        def querysets(excluded):
+            query_params = self.request.query_params
+            if not any(name in query_params for name in excluded):
+                return queryset
+            query_params = query_params.copy()
+            for name in excluded:
+                query_params.pop(name, None)
+            return self.filterset_class(
+                query_params, self.get_queryset(), request=self.request).qs
+
+        return recipe_facets(
+            querysets, params.validated_data['facets'],
+            self.request.query_params)
+
+    def batch_list(self, request):
+        """Рецепты по списку id в порядке запроса, без пагинации.
+
+        Для каждого рецепта в ``versions`` возвращается версия. Если
+        клиент прислал её вместе с id (``?ids=1:версия,2``) и рецепт не
+        изменился, вместо него выводится заглушка с ``not_modified``.
+        Id несуществующих рецептов перечисляются в ``missing``.
+        """
+        params = RecipeBatchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        known = params.validated_data['ids']
+        items, included = self.recipes_items(list(known))
+        results = []
+        versions = {}
+        for recipe_id, version in known.items():
+            if recipe_id not in items:
+                continue
+            versions[recipe_id] = recipe_version(items[recipe_id])
+            if version == versions[recipe_id]:
+                results.append({'id': recipe_id, 'not_modified': True})
+            else:
+                results.append(items[recipe_id])
+        return Response({
+            'results': results,
+            'versions': versions,
+            'missing': [
+                recipe_id for recipe_id in known if recipe_id not in items],
+            **included,
+        })
+
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт из готового документа."""
+        return self.cached(self.retrieve_response)
+
+    def retrieve_response(self):
+        recipe = self.get_object()
+        results, _ = self.recipes_data([recipe.pk], compact=False)
+        return Response(results[0])
+
     def perform_create(self, serializer):
         """Создать рецепт от имени текущего пользователя."""
         serializer.save(author=self.request.user)
+        fanout_recipe(serializer.instance)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated, )
+    )
+    def feed(self, request):
+        """Лента рецептов авторов из подписок."""
+        limit = query_limit(
+            request, self.paginator.page_size, MAX_FEED_PAGE_SIZE)
+        recipe_ids, cursor = read_feed(
+            request.user, request.query_params.get('cursor'), limit)
+        next_url = None
+        if cursor is not None:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor', cursor)
+        results, included = self.recipes_data(recipe_ids)
+        return Response({
+            'next': next_url,
+            'results': results,
+            **included,
+        })
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(permissions.AllowAny, )
+    )
+    def changes(self, request):
+        """Рецепты, созданные, измененные или удаленные после курсора.
+
+        Без курсора изменения выдаются с самого начала. Курсор из ответа
+        передается в следующий запрос; ``has_more`` означает, что за ним
+        уже есть изменения.
+        """
+        changed, deleted, cursor, has_more = read_changes(
+            request.query_params.get('cursor'),
+            query_limit(request, MAX_CHANGES_BATCH, MAX_CHANGES_BATCH))
+        results, included = self.recipes_data(changed)
+        return Response({
+            'cursor': cursor,
+            'has_more': has_more,
+            'changed': results,
+            'deleted': deleted,
+            **included,
+        })
+
+    @action(
+        methods=['post'],
+        detail=False,
+        url_path='images',
+        permission_classes=(permissions.IsAuthenticated, ),
+        parser_classes=(MultiPartParser, RawImageUploadParser)
+    )
+    def upload_image(self, request):
+        """Загрузить изображение без base64.
+
+        Возвращает имя файла, которое можно передать в поле ``image``
+        при создании или изменении рецепта.
+        """
+        request.upload_handlers = [CappedUploadHandler()]
+        upload = request.FILES.get('image') or request.FILES.get('file')
+        try:
+            serializer = ImageUploadSerializer(data={'image': upload})
+            serializer.is_valid(raise_exception=True)
+            name = serializer.save()
+        finally:
+            if upload is not None:
+                upload.close()
+        return Response(
+            {'image': name, 'url': image_url(name, request)},
+            status=status.HTTP_201_CREATED
+        )
+
+    def add_relation(self, request, pk, model, serializer_class, error):
+        """Связать рецепт с пользователем одним INSERT.
+
+        Повторное добавление отсекает уникальное ограничение модели,
+        поэтому одновременные запросы не приводят к ошибке 500.
+        """
+        recipe = get_object_or_404(
+            Recipe.objects.only(
+                'id', 'name', 'image', 'image_variants', 'cooking_time'),
+            pk=pk
+        )
+        try:
+            with transaction.atomic():
+                relation = model.objects.create(
+                    user=request.user, recipe=recipe)
+        except IntegrityError:
+            return Response(
+                data={'errors': error}, status=status.HTTP_400_BAD_REQUEST)
+        count_activity(model, [recipe.pk], 1)
+        serializer = serializer_class(relation, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def remove_relation(self, request, pk, model, error):
+        """Удалить связь рецепта с пользователем одним DELETE."""
+        deleted, _ = model.objects.filter(
+            user=request.user, recipe_id=pk).delete()
+        if deleted:
+            count_activity(model, [pk], -1)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, pk=pk)
+        return Response(
+            data={'errors': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    def batch_relations(self, request, model):
+        """Добавить/убрать пачку рецептов за несколько запросов к базе.
+
+        Для каждого id возвращается результат: added/exists или
+        removed/absent, либо not_found для несуществующего рецепта.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        linked = set(model.objects.filter(
+            user=user, recipe_id__in=ids).values_list('recipe_id', flat=True))
+        if request.method == 'POST':
+            found = set(Recipe.objects.filter(
+                pk__in=ids).values_list('pk', flat=True))
+            added = [pk for pk in ids if pk in found and pk not in linked]
+            model.objects.bulk_create(
+                (model(user=user, recipe_id=pk) for pk in added),
+                ignore_conflicts=True
+            )
+            count_activity(model, added, 1)
+            outcomes = {pk: 'exists' if pk in linked else 'added'
+                        for pk in found}
+        else:
+            if linked:
+                model.objects.filter(
+                    user=user, recipe_id__in=linked).delete()
+                count_activity(model, linked, -1)
+            missing = [pk for pk in ids if pk not in linked]
+            found = set(Recipe.objects.filter(
+                pk__in=missing).values_list('pk', flat=True))
+            outcomes = {pk: 'absent' for pk in found}
+            outcomes.update((pk, 'removed') for pk in linked)
+        return Response({'results': [
+            {'id': pk, 'status': outcomes.get(pk, 'not_found')}
+            for pk in ids
+        ]})
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        url_path='favorite/batch',
+        permission_classes=(permissions.IsAuthenticated, )
+    )
+    def favorite_batch(self, request):
+        """Добавить/убрать в избранное список рецептов."""
+        return self.batch_relations(request, Favorite)
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        url_path='shopping_cart/batch',
+        permission_classes=(permissions.IsAuthenticated, )
+    )
+    def shopping_cart_batch(self, request):
+        """Добавить/убрать в список покупок список рецептов."""
+        return self.batch_relations(request, ShoppingCart)
+
+    @action(
+        methods=['delete'],
+        detail=False,
+        url_path='shopping_cart',
+        permission_classes=(permissions.IsAuthenticated, )
+    )
+    def clear_shopping_cart(self, request):
+        """Очистить список покупок."""
+        cart = ShoppingCart.objects.filter(user=request.user)
+        recipe_ids = list(cart.values_list('recipe_id', flat=True))
+        cart.delete()
+        count_activity(ShoppingCart, recipe_ids, -1)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         methods=['post', 'delete'],
@@ -66,25 +468,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk=None):
         """Добавить/убрать в избранное."""
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
-            if Favorite.objects.filter(user=user, recipe=recipe).exists():
-                data = {
-                    'errors': 'Рецепт уже в Избранном, загляни'
-                }
-                return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
-            favorite = Favorite.objects.create(user=user, recipe=recipe)
-            serializer = FavoriteSerializer(
-                favorite, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if not Favorite.objects.filter(user=user, recipe=recipe).exists():
-            data = {
-                'errors': 'Такого рецепта нет в Избранном'
-            }
-            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
-        Favorite.objects.filter(user=user, recipe=recipe).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+            return self.add_relation(
+                request, pk, Favorite, FavoriteSerializer,
+                'Рецепт уже в Избранном, загляни'
+            )
+        return self.remove_relation(
+            request, pk, Favorite, 'Такого рецепта нет в Избранном')
 
     @action(
         methods=['post', 'delete'],
@@ -93,30 +483,58 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk=None):
         """Создать/удалить список покупок."""
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
-            if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-                data = {
-                    'errors': 'Этот рецепт уже есть в списке покупок'
-                }
-                return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
-            shopping_cart = ShoppingCart.objects.create(
-                user=user, recipe=recipe)
-            serializer = ShoppingCartSerializer(
-                shopping_cart, context={'request': request}
+            return self.add_relation(
+                request, pk, ShoppingCart, ShoppingCartSerializer,
+                'Этот рецепт уже есть в списке покупок'
             )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        shopping_cart = ShoppingCart.objects.filter(
-            user=user, recipe=recipe
+        return self.remove_relation(
+            request, pk, ShoppingCart, 'Этого рецепта нет в списке покупок')
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(permissions.AllowAny, )
+    )
+    def by_ingredients(self, request):
+        """Найти рецепты по имеющимся ингредиентам."""
+        params = IngredientSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        page = self.paginate_queryset(
+            find_by_ingredients(params.validated_data['ingredients']))
+        recipes = Recipe.objects.in_bulk([item[0] for item in page])
+        serializer = self.get_serializer(
+            [recipes[item[0]] for item in page if item[0] in recipes],
+            many=True
         )
-        if not shopping_cart.exists():
-            data = {
-                'errors': 'Этого рецепта нет в списке покупок'
-            }
-            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
-        shopping_cart.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        data = serializer.data
+        matches = {item[0]: item for item in page}
+        for recipe in data:
+            _, coverage, missing = matches[recipe['id']]
+            recipe['coverage'] = round(coverage, 4)
+            recipe['missing'] = missing
+        return self.get_paginated_response(data)
+
+    @action(
+        methods=['get'],
+        detail=True,
+        permission_classes=(permissions.AllowAny, )
+    )
+    def similar(self, request, pk=None):
+        """Найти рецепты с похожим набором ингредиентов."""
+        recipe = get_object_or_404(Recipe, pk=pk)
+        similar = find_similar(
+            recipe.pk, query_limit(request, 10, MAX_SIMILAR_RECIPES))
+        items, included = self.recipes_items(
+            [recipe_id for recipe_id, _ in similar])
+        # Рецепт мог быть удален после выбора кандидатов.
+        results = [
+            extend_item(items[recipe_id], {'similarity': round(similarity, 4)})
+            for recipe_id, similarity in similar if recipe_id in items
+        ]
+        if included:
+            return Response({'results': results, **included})
+        return Response(results)
 
     @action(
         methods=['get'],
@@ -125,54 +543,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def download_shopping_cart(self, request):
         """Скачать список покупок."""
-        user = request.user
-        shopping_list = {}
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__cart__user=user).values_list(
-                'ingredient__name',
-                'amount',
-                'ingredient__measurement_unit',
-                named=True)
-        for ingredient in ingredients:
-            name = ingredient.ingredient__name
-            measurement_unit = ingredient.ingredient__measurement_unit
-            amount = ingredient.amount
-            if name not in shopping_list:
-                shopping_list[name] = {
-                    'measurement_unit': measurement_unit,
-                    'amount': amount
-                }
-            else:
-                shopping_list[name]['amount'] += amount
-        return self.generate_pdf(shopping_list)
-
-    def generate_pdf(self, shopping_list):
-        """Создать pdf файл."""
-        file_name = 'ShoppingList'
-        response = HttpResponse(content_type='application/pdf')
-        content_disposition = f'attachment; filename="{file_name}.pdf"'
-        response['Content-Disposition'] = content_disposition
-        pdfmetrics.registerFont(TTFont('Neocyr', 'Neocyr.ttf', 'UTF-8'))
-        pdf = canvas.Canvas(response)
-        pdf.setFont('Neocyr', 24)
-        pdf.setFillColor(colors.black)
-        pdf.drawCentredString(300, 770, 'Список покупок')
-        pdf.setFillColor(colors.black)
-        pdf.setFont('Neocyr', 16)
-        height = 700
-        num = 1
-        for name, data in shopping_list.items():
-            pdf.drawString(
-                60,
-                height,
-                f"{num}. {name} - {data['amount']} {data['measurement_unit']}"
-            )
-            num += 1
-            height -= 25
-            if height == 50:
-                pdf.showPage()
-                pdf.setFont('Neocyr', 16)
-                height = 700
-        pdf.showPage()
-        pdf.save()
-        return response
+        return self.shopping_list_response(get_shopping_list(request.user))
+
+    def shopping_list_response(self, shopping_list):
+        with pdf_slot():
+            return pdf_response(render_shopping_list_pdf(shopping_list))
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated, )
+    )
+    def export(self, request):
+        """Выгрузить свои рецепты, избранное и список покупок в NDJSON."""
+        return self.export_response(request.user)
+
+    def export_response(self, user):
+        return export_response(export_lines(user, self.request))
@@ -0,0 +1,12 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_api.settings')
+os.environ.setdefault('ROOT_URLCONF', 'foodgram_api.asgi_urls')
+
+application = get_asgi_application()
+
+from foodgram.event_stream import EventStreamApp  # noqa: E402
+
+application = EventStreamApp(application)
@@ -0,0 +1,19 @@
+from django.urls import path
+from foodgram import async_views
+from users.async_views import subscriptions
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/recipes/', async_views.recipe_list),
+    path('api/recipes/<int:pk>/', async_views.recipe_detail),
+    path(
+        'api/recipes/download_shopping_cart/',
+        async_views.download_shopping_cart),
+    path('api/recipes/export/', async_views.export_recipes),
+    path('api/tags/', async_views.tag_list),
+    path('api/tags/<int:pk>/', async_views.tag_detail),
+    path('api/ingredients/', async_views.ingredient_list),
+    path('api/ingredients/<int:pk>/', async_views.ingredient_detail),
+    path('api/users/subscriptions/', subscriptions),
+] + sync_urlpatterns
@@ -0,0 +1,216 @@
+"""Чтение с реплик базы данных.
+
+``ReplicaRoutingMiddleware`` выбирает для каждого безопасного (GET,
+HEAD, OPTIONS) запроса одну из реплик из ``DATABASE_ROUTING['REPLICAS']``
+по кругу, а ``ReplicaRouter`` направляет на нее все чтения этого
+запроса. Запись, чтения внутри транзакции и любые запросы вне
+middleware (команды, фоновые потоки) идут в ``default``.
+
+После небезопасного запроса клиент закрепляется за основной базой на
+``PIN_SECONDS`` секунд, чтобы сразу видеть свои изменения:
+аутентифицированный пользователь - по id (id берется из токена или
+сессии), аноним - по IP. Реплика, на которой запрос упал с ошибкой
+соединения, исключается на ``EJECT_SECONDS`` секунд, а запрос
+повторяется на основной базе.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.db import InterfaceError, OperationalError, connections
+from django.http import HttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from users.authentication import CachedTokenAuthentication
+
+DEFAULT_ROUTING = {
+    'REPLICAS': [],
+    'PIN_SECONDS': 10,
+    'EJECT_SECONDS': 30,
+    'CACHE': 'default',
+}
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def routing_setting(name):
+    return getattr(settings, 'DATABASE_ROUTING', {}).get(
+        name, DEFAULT_ROUTING[name])
+
+
+class ReplicaPool:
+    """Круговой выбор реплик с исключением неисправных."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._ejected = {}
+
+    def healthy(self):
+        now = time.monotonic()
+        return [
+            alias for alias in routing_setting('REPLICAS')
+            if self._ejected.get(alias, 0) <= now
+        ]
+
+    def choose(self):
+        """Выбрать реплику или None, если исправных реплик нет."""
+        with self._lock:
+            replicas = self.healthy()
+            if not replicas:
+                return None
+            return replicas[next(self._counter) % len(replicas)]
+
+    def eject(self, alias):
+        with self._lock:
+            self._ejected[alias] = (
+                time.monotonic() + routing_setting('EJECT_SECONDS'))
+        connections[alias].close()
+
+
+replica_pool = ReplicaPool()
+
+
+def credentials_user_id(request):
+    """Id пользователя по токену или сессии запроса, еще не прошедшего
+    аутентификацию, или None."""
+    header = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(header) == 2 and header[0] == CachedTokenAuthentication.keyword:
+        try:
+            user, _ = CachedTokenAuthentication().authenticate_credentials(
+                header[1])
+        except AuthenticationFailed:
+            return None
+        return user.pk
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        session = import_module(settings.SESSION_ENGINE).SessionStore(
+            session_key)
+        return session.get(SESSION_KEY)
+    return None
+
+
+def pin_key(user_id, request):
+    """Ключ кеша, по которому клиент закрепляется за основной базой."""
+    if user_id is not None:
+        return f'db-pin:user:{user_id}'
+    return 'db-pin:ip:' + request.META.get(
+        'HTTP_X_REAL_IP', request.META.get('REMOTE_ADDR', ''))
+
+
+def pin_cache():
+    return caches[routing_setting('CACHE')]
+
+
+def is_pinned(request):
+    return bool(pin_cache().get(
+        pin_key(credentials_user_id(request), request)))
+
+
+def pin(request):
+    """Закрепить клиента после обработки небезопасного запроса.
+
+    К этому моменту DRF уже записал в запрос аутентифицированного
+    пользователя.
+    """
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    pin_cache().set(
+        pin_key(user_id, request), True, routing_setting('PIN_SECONDS'))
+
+
+class ReplicaRouter:
+    """Роутер: чтение с выбранной для запроса реплики, запись в default."""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections['default'].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaFailedResponse(HttpResponse):
+    """Ответ-заглушка: запрос надо повторить на основной базе."""
+
+    status_code = 503
+
+
+class ReplicaRoutingMiddleware:
+    """Выбор базы для чтения на время обработки запроса."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @staticmethod
+    def read_alias(request):
+        if (request.method not in SAFE_METHODS
+                or not routing_setting('REPLICAS') or is_pinned(request)):
+            return None
+        return replica_pool.choose()
+
+    @staticmethod
+    def needs_pin(request):
+        return (request.method not in SAFE_METHODS
+                and bool(routing_setting('REPLICAS')))
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        response = self.route(request, self.read_alias(request))
+        if isinstance(response, ReplicaFailedResponse):
+            return self.route(request, None)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.aroute(
+            request, await sync_to_async(self.read_alias)(request))
+        if isinstance(response, ReplicaFailedResponse):
+            return await self.aroute(request, None)
+        return response
+
+    def route(self, request, alias):
+        context = _read_alias.set(alias)
+        try:
+            return self.get_response(request)
+        finally:
+            _read_alias.reset(context)
+            if self.needs_pin(request):
+                pin(request)
+
+    async def aroute(self, request, alias):
+        context = _read_alias.set(alias)
+        try:
+            return await self.get_response(request)
+        finally:
+            _read_alias.reset(context)
+            if self.needs_pin(request):
+                await sync_to_async(pin)(request)
+
+    def process_exception(self, request, exception):
+        alias = _read_alias.get()
+        if alias is None or not isinstance(
+                exception, (OperationalError, InterfaceError)):
+            return None
+        replica_pool.eject(alias)
+        return ReplicaFailedResponse()
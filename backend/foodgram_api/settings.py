@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram_api.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -38,7 +39,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'foodgram_api.urls'
+ROOT_URLCONF = os.getenv('ROOT_URLCONF', default='foodgram_api.urls')
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
@@ -59,6 +60,23 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram_api.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram_api.asgi.application'
+
+# Пулы асинхронного режима: потоки для ORM и процессы для pdf.
+ASYNC_ORM_THREADS = int(os.getenv('ASYNC_ORM_THREADS', default=16))
+
+ASYNC_PDF_PROCESSES = int(os.getenv('ASYNC_PDF_PROCESSES', default=2))
+
+# Процессы для копий изображений рецептов (в любом режиме).
+ASYNC_IMAGE_PROCESSES = int(os.getenv('ASYNC_IMAGE_PROCESSES', default=2))
+
+# Поток событий о новых рецептах (только в режиме ASGI).
+RECIPE_EVENTS_BROKER = os.getenv(
+    'RECIPE_EVENTS_BROKER', default='foodgram.events.LocalBroker')
+
+RECIPE_EVENTS_MAX_CONNECTIONS = int(
+    os.getenv('RECIPE_EVENTS_MAX_CONNECTIONS', default=10000))
+
 
 DATABASES = {
     'default': {
@@ -71,6 +89,44 @@ DATABASES = {
     }
 }
 
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+# Реплики для чтения: через запятую хосты PostgreSQL
+# (или пути к файлам, если DB_ENGINE - SQLite). Закрепление за основной
+# базой хранится в кеше CACHE, с репликами он должен быть общим.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(','))):
+    alias = f'replica_{index}'
+    location = 'NAME' if 'sqlite' in DATABASES['default']['ENGINE'] else 'HOST'
+    DATABASES[alias] = dict(
+        DATABASES['default'], **{location: replica.strip()},
+        TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram_api.db_router.ReplicaRouter']
+
+DATABASE_ROUTING = {
+    'REPLICAS': DATABASE_REPLICAS,
+    'PIN_SECONDS': int(os.getenv('DB_REPLICA_PIN_SECONDS', default=10)),
+    'EJECT_SECONDS': int(os.getenv('DB_REPLICA_EJECT_SECONDS', default=30)),
+    'CACHE': 'default',
+}
+
+# Общий для процессов кеш: слоты отрисовки pdf, корзины ограничения
+# частоты, версия кеша рецептов, закрепление за основной базой. В рабочем
+# окружении - memcached (см. infra/docker-compose.yml); кеш в памяти
+# процесса годится только для одного процесса, о чем предупреждает check.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -93,18 +149,45 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
 
+    # Перед приложением стоит nginx: адрес клиента - последний в
+    # X-Forwarded-For.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default=1)),
+
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6
 }
 
+# Корзина токенов на пользователя (анонима - на IP) для дорогих запросов и
+# лимит одновременной отрисовки pdf. STORE=foodgram.throttling.CacheBucketStore хранит
+# корзины в общем кеше CACHE.
+THROTTLE = {
+    'CAPACITY': int(os.getenv('THROTTLE_CAPACITY', default=60)),
+    'REFILL_RATE': float(os.getenv('THROTTLE_REFILL_RATE', default=1)),
+    # Отдельная корзина для запросов дороже одного токена.
+    'HEAVY_CAPACITY': int(os.getenv('THROTTLE_HEAVY_CAPACITY', default=60)),
+    'HEAVY_REFILL_RATE': float(
+        os.getenv('THROTTLE_HEAVY_REFILL_RATE', default=1)),
+    'STORE': os.getenv(
+        'THROTTLE_STORE', default='foodgram.throttling.LocalBucketStore'),
+    'CACHE': os.getenv('THROTTLE_CACHE', default='default'),
+    'PDF_CONCURRENCY': int(os.getenv('THROTTLE_PDF_CONCURRENCY', default=2)),
+}
+
+
+TOKEN_AUTH_CACHE = {
+    'TTL': int(os.getenv('TOKEN_AUTH_CACHE_TTL', default=60)),
+    'MAX_SIZE': 10000,
+    'BACKEND': os.getenv('TOKEN_AUTH_CACHE_BACKEND') or None,
+}
+
 
 DJOSER = {
     'PASSWORD_RESET_CONFIRM_URL': '#/password/reset/confirm/{uid}/{token}',
@@ -143,3 +226,15 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Кеш ответов со списком и страницами рецептов для анонимов, секунд
+# (0 - выключен). Устаревший ответ отдается еще STALE_SECONDS секунд,
+# пока один запрос считает новый.
+RECIPE_PAGE_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_PAGE_CACHE_TIMEOUT', default=60))
+RECIPE_PAGE_CACHE_STALE_SECONDS = int(
+    os.getenv('RECIPE_PAGE_CACHE_STALE_SECONDS', default=30))
+
+# Лимит потоковой загрузки изображения рецепта, байт.
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_UPLOAD_SIZE', default=10 * 1024 * 1024))
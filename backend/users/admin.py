@@ -1,13 +1,30 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from foodgram.custom_mixins import FastDeleteAdminMixin
+from foodgram.deletion import schedule_user_deletion
 
 from .models import CustomUser
 
 
-class CustomUserAdmin(admin.ModelAdmin):
+class CustomUserAdmin(FastDeleteAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'email', 'username', 'first_name', 'last_name')
     list_filter = ('email', 'username')
     search_fields = ('email', 'username')
     empty_value_display = '-пусто-'
 
+    def delete_model(self, request, obj):
+        job = schedule_user_deletion(obj)
+        if job is not None:
+            self.message_user(
+                request,
+                f'У {obj} много рецептов: пользователь заблокирован и '
+                'удаляется в фоне, ход удаления виден в разделе '
+                '«Удаления пользователей».',
+                messages.WARNING
+            )
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset.iterator():
+            self.delete_model(request, user)
+
 
 admin.site.register(CustomUser, CustomUserAdmin)
@@ -0,0 +1,6 @@
+"""Асинхронные представления пользователей для ASGI."""
+from foodgram.offload import read_async
+
+from .views import CustomUserViewSet
+
+subscriptions = read_async(CustomUserViewSet.as_view({'get': 'subscriptions'}))
@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+DEFAULT_TOKEN_CACHE = {
+    'TTL': 60,
+    'MAX_SIZE': 10000,
+    'BACKEND': None,
+}
+
+
+def token_cache_setting(name):
+    return getattr(settings, 'TOKEN_AUTH_CACHE', {}).get(
+        name, DEFAULT_TOKEN_CACHE[name])
+
+
+class TokenCache:
+    """LRU-кеш проверенных токенов с временем жизни записей.
+
+    Кеш локален для процесса. Если в ``TOKEN_AUTH_CACHE['BACKEND']``
+    указан алиас из ``CACHES``, записи дублируются в общий кеш, чтобы
+    процессы переиспользовали проверку токена друг друга.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def shared_key(key):
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def shared_cache():
+        alias = token_cache_setting('BACKEND')
+        return caches[alias] if alias else None
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+        shared = self.shared_cache()
+        if shared is None:
+            return None
+        token = shared.get(self.shared_key(key))
+        if token is None:
+            return None
+        self._remember(key, token, now)
+        return token
+
+    def set(self, key, token):
+        self._remember(key, token, time.monotonic())
+        shared = self.shared_cache()
+        if shared is not None:
+            shared.set(
+                self.shared_key(key), token, token_cache_setting('TTL'))
+
+    def _remember(self, key, token, now):
+        with self._lock:
+            self._entries[key] = (now + token_cache_setting('TTL'), token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > token_cache_setting('MAX_SIZE'):
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        shared = self.shared_cache()
+        if shared is not None and keys:
+            shared.delete_many([self.shared_key(key) for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену без запроса к базе при попадании в кеш.
+
+    Отзыв токена (выход из системы), смена пароля и блокировка
+    пользователя сбрасывают кеш через сигналы. В других процессах
+    локальные записи устаревают не позже чем через
+    ``TOKEN_AUTH_CACHE['TTL']`` секунд.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is not None:
+            return token.user, token
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, token)
+        return user, token
+
+
+def invalidate_user_tokens(user_id):
+    """Сбросить закешированные токены пользователя."""
+    token_cache.delete(*Token.objects.filter(
+        user_id=user_id).values_list('key', flat=True))
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_user_tokens, token_cache
+
+User = get_user_model()
+
+SNAPSHOT_IGNORED_FIELDS = frozenset(('last_login',))
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    """Сбросить кеш удаленного токена (выход из системы)."""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, update_fields, **kwargs):
+    """Сбросить кеш токенов после изменения пользователя."""
+    if created:
+        return
+    if update_fields and SNAPSHOT_IGNORED_FIELDS.issuperset(update_fields):
+        return
+    invalidate_user_tokens(instance.pk)
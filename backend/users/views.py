@@ -1,7 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from djoser.views import UserViewSet
+from foodgram.deletion import schedule_user_deletion
+from foodgram.feed import follow_author, unfollow_author
 from foodgram.models import Follow
-from foodgram.serializers import FollowSerializer
+from foodgram.serializers import FollowSerializer, subscription_data
 from rest_framework import permissions, status
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
@@ -11,10 +14,17 @@ from .serializers import CustomUserSerializer
 
 User = get_user_model()
 
+SUBSCRIBE_ERROR = ('Вы уже подписаны на этого автора рецептов '
+                   'или пытаетесь подписаться на самого себя')
+
 
 class CustomUserViewSet(UserViewSet):
     serializer_class = CustomUserSerializer
 
+    def perform_destroy(self, instance):
+        """Удалить пользователя без загрузки связанных строк в память."""
+        schedule_user_deletion(instance)
+
     @action(detail=False,
             methods=['get'],
             permission_classes=(permissions.IsAuthenticated,)
@@ -34,24 +44,26 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=(permissions.IsAuthenticated, )
     )
     def subscribe(self, request, id=None):
-        author = get_object_or_404(User, id=id)
         user = request.user
-        check_subscribe = Follow.objects.filter(
-            user=user, author=author).exists()
         if request.method == 'POST':
-            if check_subscribe or user == author:
-                return Response({
-                    'errors': ('Вы уже подписаны на этого автора рецептов '
-                               'или пытаетесь подписаться на самого себя')
-                }, status=status.HTTP_400_BAD_REQUEST)
-            subscribe = Follow.objects.create(user=user, author=author)
-            serializer = FollowSerializer(
-                subscribe, context={'request': request}
-            )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if check_subscribe:
-            Follow.objects.filter(user=user, author=author).delete()
+            author = get_object_or_404(User, id=id)
+            if user == author:
+                return Response({'errors': SUBSCRIBE_ERROR},
+                                status=status.HTTP_400_BAD_REQUEST)
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(user=user, author=author)
+            except IntegrityError:
+                return Response({'errors': SUBSCRIBE_ERROR},
+                                status=status.HTTP_400_BAD_REQUEST)
+            follow_author(user.id, author.id)
+            return Response(subscription_data(author, request),
+                            status=status.HTTP_201_CREATED)
+        deleted, _ = Follow.objects.filter(user=user, author_id=id).delete()
+        if deleted:
+            unfollow_author(user.id, id)
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(User, id=id)
         return Response({
             'errors': 'Вы не были подписаны на этого автора рецептов'
         }, status=status.HTTP_400_BAD_REQUEST)